@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+#-*- coding: utf_8 -*-
+
+"""
+aio.py
+
+This module provides an asyncio wrapper around DbaseFile, so that asyncio based programs
+can read and write DBase III files without blocking the event loop.
+Blocking calls run in a bounded thread pool; iteration is done in chunks, each one read
+and decoded in the pool, with a bounded number of chunks read ahead of the consumer.
+
+Classes:
+    AsyncDbaseFile
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+try:
+    from dbase3_py.dbase3 import DbaseFile
+except ImportError:
+    from dbase3 import DbaseFile
+
+
+async def _aiterate(iterable):
+    """
+    Asynchronous generator over the items of a plain iterable.
+    Meant for internal use only.
+    """
+    for item in iterable:
+        yield item
+
+
+class AsyncDbaseFile:
+    """
+    Asyncio wrapper around a DbaseFile.
+
+    Unless the wrapped DbaseFile is thread safe (see DbaseFile's thread_safe parameter),
+    calls are run one at a time, as the DbaseFile's file position is shared.
+
+        async with AsyncDbaseFile('db/test.dbf') as dbf:
+            record = await dbf.get_record(0)
+            async for record in dbf.aiter(chunk_size=1024):
+                await send(record)
+
+    Methods:
+        __init__(self, dbf, max_workers=4, prefetch=2)
+        open(cls, filename, max_workers=4, prefetch=2, **kwargs)
+        close(self)
+        get_record(self, key, fields=None)
+        aiter(self, start=0, stop=None, chunk_size=1024, fields=None)
+        filter(self, fieldname, value, comp_func=None)
+        where(self, fieldname, op, value, start=0, stop=None)
+        find(self, fieldname, value, start=0, comp_func=None)
+        add_record(self, *data)
+        add_records(self, rows, chunk_size=4096)
+        save_record(self, key, record)
+        update_record(self, key, record)
+        del_record(self, key, value=True)
+        commit(self, filename=None)
+        pack(self)
+    """
+
+    def __init__(self, dbf, max_workers: int = 4, prefetch: int = 2):
+        """
+        :param dbf: DbaseFile to wrap, or name of a database file, opened in thread safe mode.
+        :param max_workers: Maximum number of threads running calls at once.
+        :param prefetch: Maximum number of chunks read ahead of the consumer by aiter().
+        """
+        if not isinstance(dbf, DbaseFile):
+            dbf = DbaseFile(dbf, thread_safe=True)
+        self.dbf = dbf
+        self.prefetch = max(prefetch, 1)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers if dbf.thread_safe else 1)
+
+    @classmethod
+    async def open(cls, filename, max_workers: int = 4, prefetch: int = 2, **kwargs):
+        """
+        Opens a database file without blocking the event loop. Keyword arguments go to DbaseFile
+        (thread_safe defaults to True).
+        """
+        kwargs.setdefault('thread_safe', True)
+        loop = asyncio.get_running_loop()
+        dbf = await loop.run_in_executor(None, partial(DbaseFile, filename, **kwargs))
+        return cls(dbf, max_workers, prefetch)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    def __len__(self):
+        return len(self.dbf)
+
+    def __str__(self):
+        return f"AsyncDbaseFile({self.dbf.filename})"
+
+    async def _run(self, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) in the executor and returns its result.
+        Meant for internal use only.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def close(self):
+        """
+        Waits for pending calls and shuts the executor down. The DbaseFile is left open.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, partial(self.executor.shutdown, wait=True))
+
+    async def get_record(self, key, fields=None):
+        """
+        Retrieves a record (see DbaseFile.get_record).
+        """
+        return await self._run(self.dbf.get_record, key, fields)
+
+    async def aiter(self, start=0, stop=None, chunk_size=1024, fields=None):
+        """
+        Asynchronous generator over the records in the range [start, stop).
+        Records are read and decoded chunk_size at a time in the executor. At most 'prefetch'
+        chunks are read ahead, so a slow consumer (i.e. a network client) holds back the reads
+        instead of letting records pile up in memory.
+
+        :param start: Index of the first record.
+        :param stop: Index past the last record. Defaults to the number of records.
+        :param chunk_size: Number of records read at once.
+        :param fields: Names of the fields to read, or None for all of them.
+        """
+        if start is None or start < 0:
+            start = 0
+        if stop is None or stop > len(self.dbf):
+            stop = len(self.dbf)
+        loop = asyncio.get_running_loop()
+        read = lambda a, b: list(self.dbf.iter_records(a, b, chunk_size, fields))
+        bounds = iter([(a, min(a + chunk_size, stop)) for a in range(start, stop, chunk_size)])
+        pending = []
+        try:
+            while True:
+                # Keep up to 'prefetch' chunks being read while the consumer takes records
+                while len(pending) < self.prefetch:
+                    chunk = next(bounds, None)
+                    if chunk is None:
+                        break
+                    pending.append(loop.run_in_executor(self.executor, read, *chunk))
+                if not pending:
+                    break
+                for record in await pending.pop(0):
+                    yield record
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def filter(self, fieldname, value, comp_func=None):
+        """
+        Returns a list with the matching records (see DbaseFile.filter).
+        """
+        return await self._run(self.dbf.filter, fieldname, value, comp_func)
+
+    async def where(self, fieldname, op, value, start=0, stop=None):
+        """
+        Returns a list with the matching records (see DbaseFile.where).
+        """
+        return await self._run(lambda: list(self.dbf.where(fieldname, op, value, start, stop)))
+
+    async def find(self, fieldname, value, start=0, comp_func=None):
+        """
+        Returns the first matching record, or None (see DbaseFile.find).
+        """
+        return await self._run(self.dbf.find, fieldname, value, start, comp_func)
+
+    async def add_record(self, *data):
+        """
+        Adds a record (see DbaseFile.add_record).
+        """
+        return await self._run(self.dbf.add_record, *data)
+
+    async def add_records(self, rows, chunk_size=4096):
+        """
+        Adds many records (see DbaseFile.add_records). 'rows' may be an iterable or an
+        asynchronous iterable; rows are taken chunk_size at a time, and each chunk is
+        written in the executor before the next one is taken.
+
+        :return: Number of records added.
+        """
+        appender = self.dbf.bulk_append(chunk_size)
+        if not hasattr(rows, '__aiter__'):
+            rows = _aiterate(rows)
+        try:
+            chunk = []
+            async for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    await self._run(appender.add_records, chunk)
+                    chunk = []
+            if chunk:
+                await self._run(appender.add_records, chunk)
+        finally:
+            await self._run(appender.close)
+        return appender.added
+
+    async def save_record(self, key, record):
+        """
+        Writes a record (see DbaseFile.save_record).
+        """
+        return await self._run(self.dbf.save_record, key, record)
+
+    async def update_record(self, key, record):
+        """
+        Updates a record (see DbaseFile.update_record).
+        """
+        return await self._run(self.dbf.update_record, key, record)
+
+    async def del_record(self, key, value=True):
+        """
+        Marks a record as deleted, or unmarks it (see DbaseFile.del_record).
+        """
+        return await self._run(self.dbf.del_record, key, value)
+
+    async def commit(self, filename=None):
+        """
+        Writes the database skipping deleted records (see DbaseFile.commit).
+        """
+        return await self._run(self.dbf.commit, filename)
+
+    async def pack(self):
+        """
+        Removes the deleted records in place (see DbaseFile.pack).
+        """
+        return await self._run(self.dbf.pack)
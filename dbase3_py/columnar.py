@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+#-*- coding: utf_8 -*-
+
+"""
+columnar.py
+
+This module provides vectorized parsing of DBase III fields using NumPy.
+Records are viewed as a 2D array of bytes (one row per record), so that each field
+is a fixed width column which is parsed as a whole, without building a Python object per value.
+
+NumPy is an optional dependency: importing this module works without it,
+but calling any of its functions raises ImportError.
+
+Functions:
+    records_array(buffer, record_size)
+    match_column(column, fieldtype, decimal, op, value)
+    parse_column(column, fieldtype, decimal)
+    parse_character(column)
+    parse_numeric(column, integer)
+    parse_date(column)
+    parse_logical(column)
+"""
+
+import operator
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Bytes stripped from the ends of character fields: nulls and latin1 whitespace
+_blanks = np and np.array([c == 0 or chr(c).isspace() for c in range(256)])
+# Table folding latin1 bytes to lower case, as str.lower() does for latin1 characters
+_lower_table = bytes(ord(chr(c).lower()) for c in range(256))
+# Table turning blanks (nulls and latin1 whitespace) into spaces
+_space_table = bytes(32 if c == 0 or chr(c).isspace() else c for c in range(256))
+# Bytes found in plain numbers
+_numeric_chars = np and np.array([chr(c) in '0123456789+-. ' for c in range(256)])
+
+
+def require_numpy():
+    """
+    Raises ImportError if NumPy is not available.
+    """
+    if np is None:
+        raise ImportError("NumPy is required for columnar access. Install it with 'pip install numpy'.")
+
+
+def records_array(buffer, record_size: int):
+    """
+    Returns a 2D uint8 array (records x record_size) viewing the bytes of consecutive records.
+    Trailing bytes not making up a whole record are ignored.
+    """
+    require_numpy()
+    count = len(buffer) // record_size
+    return np.frombuffer(buffer, dtype=np.uint8, count=count * record_size).reshape(count, record_size)
+
+
+def parse_character(column):
+    """
+    Returns an array of str out of a column of character fields, with padding stripped.
+    Bytes are read as latin1, which maps each byte to the code point of the same value.
+    """
+    require_numpy()
+    count, width = column.shape
+    if not width:
+        return np.zeros(count, dtype='U1')
+    blank = _blanks[column]
+    filled = ~blank
+    any_filled = filled.any(axis=1)
+    last = np.where(any_filled, width - 1 - np.argmax(filled[:, ::-1], axis=1), -1)
+    # Trailing blanks become nulls, which str arrays drop by themselves; inner nulls become spaces
+    trailing = np.arange(width) > last[:, None]
+    codes = np.where(trailing, 0, np.where(column == 0, 32, column)).astype(np.uint32)
+    text = codes.view(f'U{width}').ravel()
+    if (blank[:, 0] & any_filled).any():
+        text = np.char.lstrip(text)
+    return text
+
+
+def _numeric_fallback(column, rows, values):
+    """
+    Parses the given rows of a numeric column one by one with float(),
+    for content NumPy doesn't parse by itself. Unparsable values become NaN.
+    """
+    for row in rows:
+        content = column[row].tobytes().decode('latin1').strip('\x00').strip()
+        try:
+            values[row] = float(content) if content else 0.0
+        except ValueError:
+            values[row] = np.nan
+
+
+def parse_numeric(column, integer: bool = False):
+    """
+    Returns an array of numbers out of a column of numeric fields (right aligned ASCII,
+    optional sign and decimal point). Blank values are 0, as in DbaseFile records.
+    If 'integer' is True and every value is a valid integer the result is int64, otherwise float64,
+    with NaN for unparsable values.
+    """
+    require_numpy()
+    count, width = column.shape
+    if not width:
+        return np.zeros(count, dtype=np.int64 if integer else np.float64)
+    column = np.ascontiguousarray(column)
+    text = column.view(f'S{width}').ravel()
+    blank = _blanks[column].all(axis=1)
+    if blank.any():
+        text = np.where(blank, b'0', text)
+    if integer:
+        try:
+            return text.astype(np.int64)
+        except (ValueError, OverflowError):
+            pass
+    try:
+        return text.astype(np.float64)
+    except ValueError:
+        pass
+    # Some values are not plain numbers: parse the rows NumPy can, one by one the rest
+    values = np.zeros(count, dtype=np.float64)
+    plain = ~(~_numeric_chars[column]).any(axis=1) & ~blank
+    try:
+        values[plain] = text[plain].astype(np.float64)
+        rest = np.flatnonzero(~plain & ~blank)
+    except ValueError:
+        rest = np.flatnonzero(~blank)
+    _numeric_fallback(column, rest, values)
+    return values
+
+
+def parse_date(column):
+    """
+    Returns a datetime64[D] array out of a column of YYYYMMDD date fields.
+    Blank and invalid dates are NaT.
+    """
+    require_numpy()
+    count = column.shape[0]
+    if column.shape[1] != 8:
+        return np.full(count, np.datetime64('NaT'), dtype='datetime64[D]')
+    digit = (column >= 48) & (column <= 57)
+    digits = column.astype(np.int64) - 48
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    valid = digit.all(axis=1) & (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+    year, month, day = np.where(valid, year, 1970), np.where(valid, month, 1), np.where(valid, day, 1)
+    months = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1).astype('timedelta64[M]')
+    month_days = ((months + np.timedelta64(1, 'M')).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+    valid &= day <= month_days
+    dates = months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    dates[~valid] = np.datetime64('NaT')
+    return dates
+
+
+def parse_logical(column):
+    """
+    Returns a bool array out of a column of logical fields (T, t, Y or y are True).
+    """
+    require_numpy()
+    first = column[:, 0]
+    return (first == ord('T')) | (first == ord('t')) | (first == ord('Y')) | (first == ord('y'))
+
+
+def parse_column(column, fieldtype: str, decimal: int = 0):
+    """
+    Parses a column of fields of the given type (C, N, F, D, L or M) into an array.
+    Memo fields become the block numbers of the memos.
+
+    :raises ValueError: For unsupported field types.
+    """
+    if fieldtype == 'C':
+        return parse_character(column)
+    elif fieldtype == 'N':
+        return parse_numeric(column, integer=decimal == 0)
+    elif fieldtype == 'F':
+        return parse_numeric(column)
+    elif fieldtype == 'D':
+        return parse_date(column)
+    elif fieldtype == 'L':
+        return parse_logical(column)
+    elif fieldtype == 'M':
+        # Memo fields hold the number of the first block of the memo in the memo file
+        return parse_numeric(column, integer=True)
+    raise ValueError(f"Unknown field type {fieldtype}")
+
+
+_comparisons = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def _match_prefix(column, op, value):
+    """
+    Matches a column of character fields against a prefix ('startswith', 'istartswith') or a value ('=='),
+    comparing raw bytes. Rows whose field starts with a blank are always matched, as their stripped 
+    content is shifted with respect to the raw bytes.
+    """
+    count, width = column.shape
+    if op == 'istartswith':
+        value = value.lower()
+    try:
+        pattern = value.encode('latin1')
+    except UnicodeEncodeError:
+        return np.zeros(count, dtype=bool)
+    if op == '==':
+        if len(pattern) > width:
+            return np.zeros(count, dtype=bool)
+        pattern = pattern.ljust(width)
+    elif len(pattern) > width:
+        return np.zeros(count, dtype=bool)
+    elif not pattern:
+        return np.ones(count, dtype=bool)
+    table = np.frombuffer(_space_table, dtype=np.uint8)
+    if op == 'istartswith':
+        table = np.frombuffer(_lower_table, dtype=np.uint8)[table]
+    raw = table[column[:, :len(pattern)]]
+    mask = (raw == np.frombuffer(pattern, dtype=np.uint8)).all(axis=1)
+    return mask | _blanks[column[:, 0]]
+
+
+def match_column(column, fieldtype: str, decimal: int, op: str, value):
+    """
+    Evaluates a simple predicate on a column of raw fields, returning a bool array with the rows
+    which may match. The result is a superset of the matching rows: callers are expected to check
+    the candidate rows against the decoded values. Returns None if the predicate cannot be 
+    evaluated on the raw column, in which case every row has to be checked.
+
+    :param column: 2D uint8 array (records x field length).
+    :param fieldtype: Type of the field (C, N, F, D or L).
+    :param decimal: Decimal places of the field.
+    :param op: One of '==', '!=', '<', '<=', '>', '>=', 'between', 'startswith' or 'istartswith'.
+    :param value: Value to compare with, or (low, high) tuple for 'between'.
+    """
+    require_numpy()
+    if op == 'between':
+        low, high = value
+        lower = match_column(column, fieldtype, decimal, '>=', low)
+        upper = match_column(column, fieldtype, decimal, '<=', high)
+        if lower is None or upper is None:
+            return None
+        return lower & upper
+    if fieldtype == 'C':
+        if not isinstance(value, str):
+            return None
+        if op in ('startswith', 'istartswith', '=='):
+            return _match_prefix(column, op, value)
+        if op in _comparisons:
+            return _comparisons[op](parse_character(column), value)
+        return None
+    if op not in _comparisons:
+        return None
+    if fieldtype in ('N', 'F'):
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return None
+        values = parse_numeric(column, integer=fieldtype == 'N' and decimal == 0)
+        return _comparisons[op](values, value)
+    if fieldtype == 'D':
+        if not isinstance(value, datetime) or value.tzinfo is not None:
+            return None
+        dates = parse_date(column).astype('datetime64[us]')
+        return _comparisons[op](dates, np.datetime64(value, 'us'))
+    if fieldtype == 'L':
+        if not isinstance(value, bool):
+            return None
+        return _comparisons[op](parse_logical(column), value)
+    return None
@@ -11,25 +11,57 @@ Classes:
     DBaseFile (Main class)
     DbaseHeader
     DbaseField
+    Record
+    LazyRecord
+    RecordDecoder
+    RecordEncoder
+    RecordsView
+    IndexKey
+    HashIndex
+    RecordCache
+    BulkAppender
+    Batch
+    _FileLocks
+
+See also dbt.py (memo files), ndx.py (index files), columnar.py (NumPy columns) and aio.py (asyncio).
 """
 
 # Title: dBase III File Reader and Writer
 
-import struct, os
-from mmap import mmap as memmap, ACCESS_WRITE
+import struct, os, operator, tempfile, shutil
+from mmap import mmap as memmap, ACCESS_READ
 from enum import Enum
 from typing import List, Dict, Tuple, Callable, AnyStr, ByteString
 from dataclasses import dataclass, field #, fields, field, is_dataclass
-from datetime import datetime
+from datetime import datetime, date
+from itertools import islice, chain
+from bisect import bisect_left, insort
+from collections.abc import Sequence, Mapping
+from collections import OrderedDict
 from multiprocessing.pool import ThreadPool
+from concurrent.futures import ProcessPoolExecutor
 # from multiprocessing import Pool
-from threading import Lock
+from threading import Lock, RLock, Condition
+from contextlib import contextmanager
+from functools import wraps, lru_cache
+from copy import copy
 # from multiprocessing import Lock
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 try:
     from dbase3_py.utils import Dict
+    from dbase3_py.ndx import NdxIndex, fold_upper
+    from dbase3_py.dbt import DbtFile, Memo
+    from dbase3_py import columnar
 except ImportError:
     from utils import Dict
+    from ndx import NdxIndex, fold_upper
+    from dbt import DbtFile, Memo
+    import columnar
 
 
 
@@ -41,15 +73,148 @@ getMonth = lambda: datetime.now().month
 getDay = lambda: datetime.now().day
 
 class Record(Dict):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.deleted = False
+        if 'deleted' not in self:
+            self.deleted = False
 
     def __repr__(self):
         return "\n".join(f"{k}: {v}" for k, v in self.items())
 
     def __str__(self):
         return self.__repr__() + "\n"
+
+
+class LazyRecord(Record):
+    """
+    Record backed by the text of the raw record, which decodes each field only when it is 
+    first accessed, keeping the value afterwards. 'deleted' and 'offset' are set up front.
+    Mapping wide operations (iteration, len, items, comparison, copy, pickling...) decode 
+    every field at once, after which it is a plain Record.
+    """
+
+    __slots__ = ('_decoder', '_text')
+
+    def __init__(self, decoder, text: str, offset: int = 0):
+        """
+        :param decoder: RecordDecoder of the database.
+        :param text: Text of the raw record (decoded as latin1), starting with the deletion flag.
+        :param offset: Offset of the record in the file.
+        """
+        dict.__init__(self, deleted=text[0] == '*', offset=offset)
+        object.__setattr__(self, '_decoder', decoder)
+        object.__setattr__(self, '_text', text)
+
+    def __missing__(self, key):
+        if self._text is None or key not in self._decoder.fields_by_name:
+            raise KeyError(key)
+        value = self._decoder.decode_field(self._text, key)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def _load(self):
+        """
+        Decodes the fields not accessed yet, keeping the order of the fields.
+        Meant for internal use only.
+        """
+        text = self._text
+        if text is None:
+            return
+        object.__setattr__(self, '_text', None)
+        if dict.__len__(self) == 2:
+            # Nothing accessed yet: decode the whole record at once
+            self._decoder._fill(self, text, 0)
+            return
+        values = {name: dict.__getitem__(self, name) if dict.__contains__(self, name) 
+                  else self._decoder.decode_field(text, name) for name in self._decoder.names}
+        extra = {key: value for key, value in dict.items(self) if key not in values}
+        deleted, offset = extra.pop('deleted'), extra.pop('offset')
+        dict.clear(self)
+        dict.update(self, deleted=deleted, offset=offset)
+        dict.update(self, values)
+        dict.update(self, extra)
+
+    @property
+    def loaded(self):
+        """
+        True if every field has been decoded.
+        """
+        return self._text is None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (self._text is not None and key in self._decoder.fields_by_name)
+
+    def __delitem__(self, key):
+        self._load()
+        dict.__delitem__(self, key)
+
+    def __iter__(self):
+        self._load()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._load()
+        return dict.__len__(self)
+
+    def __eq__(self, other):
+        self._load()
+        if isinstance(other, LazyRecord):
+            other._load()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def keys(self):
+        self._load()
+        return dict.keys(self)
+
+    def values(self):
+        self._load()
+        return dict.values(self)
+
+    def items(self):
+        self._load()
+        return dict.items(self)
+
+    def pop(self, *args):
+        self._load()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._load()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        return dict.setdefault(self, key, default)
+
+    def copy(self):
+        """
+        Returns an independent copy, which keeps the fields decoded so far and decodes the rest lazily.
+        """
+        if self._text is None:
+            return Record(dict.items(self))
+        clone = LazyRecord(self._decoder, self._text)
+        dict.clear(clone)
+        dict.update(clone, dict.items(self))
+        return clone
+
+    def __reduce__(self):
+        return (Record, (dict(self.items()),))
+
     
 class FieldType(Enum):
     CHARACTER = 'C'
@@ -141,6 +306,961 @@ class DbaseField:
         )
 
 
+def _decode_character(content):
+    return content
+
+def _decode_numeric(content):
+    if content == '':
+        return 0
+    try:
+        return int(content)
+    except ValueError:
+        try:
+            return float(content)
+        except ValueError:
+            return content
+
+def _decode_float(content):
+    if content == '':
+        return 0.0
+    try:
+        return float(content)
+    except ValueError:
+        return content
+
+_month_days = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+@lru_cache(maxsize=4096)
+def _decode_date(content):
+    # Dates repeat a lot within a table, so conversions are cached, keyed by the field content.
+    # Blank and invalid dates are returned as they are.
+    if len(content) != 8 or not (content.isascii() and content.isdigit()):
+        # strptime also takes shorter forms, i.e. '2024013' (January 3rd)
+        if not content.strip():
+            return content
+        try:
+            return datetime.strptime(content, '%Y%m%d')
+        except ValueError:
+            return content
+    year, month, day = int(content[:4]), int(content[4:6]), int(content[6:])
+    if not (year and 1 <= month <= 12 and day):
+        return content
+    if day > _month_days[month] and not (month == 2 and day == 29 and year % 4 == 0 
+                                         and (year % 100 != 0 or year % 400 == 0)):
+        return content
+    return datetime(year, month, day)
+
+def _decode_logical(content):
+    return content in ['T', 't', 'Y', 'y']
+
+_decoders = {
+    FieldType.CHARACTER.value: _decode_character,
+    FieldType.NUMERIC.value: _decode_numeric,
+    FieldType.FLOAT.value: _decode_float,
+    FieldType.DATE.value: _decode_date,
+    FieldType.LOGICAL.value: _decode_logical,
+}
+
+def _memo_decoder(memo):
+    """
+    Returns a converter turning the block number in a memo field into a lazy Memo handle
+    on the given memo file, so that memo text is read only if accessed.
+    Meant for internal use only.
+    """
+    def convert(content):
+        return Memo(memo, int(content) if content.isdigit() else 0)
+    return convert
+
+
+class RecordDecoder:
+    """
+    Record decoder compiled once for the fields of a database.
+    Field offsets, cleaned field names and converters for each field type are 
+    computed up front, so that turning the bytes of a record into a Record 
+    takes a single decoding of the record bytes and a single pass over the fields.
+    """
+
+    def __init__(self, fields: List[DbaseField], record_size: int, memo=None):
+        """
+        :param fields: List of DbaseField objects describing the record.
+        :param record_size: Size in bytes of each record, including the deletion flag.
+        :param memo: DbtFile holding the memos, for databases with memo fields.
+        """
+        self.record_size = record_size
+        self.names = [field.name.strip() for field in fields]
+        self.offsets = []
+        position = 1
+        for field in fields:
+            self.offsets.append((position, position + field.length))
+            position += field.length
+        self.converters = [_memo_decoder(memo) if field.type == FieldType.MEMO.value 
+                           else _decoders.get(field.type) or self._unknown(field.type) for field in fields]
+        self.items = [(name, convert, start, end) 
+                      for name, convert, (start, end) in zip(self.names, self.converters, self.offsets)]
+        self.fields_by_name = {name: (convert, start, end) for name, convert, start, end in self.items}
+        self.lazy = True
+        self.projections = {}
+
+    def project(self, names):
+        """
+        Returns a decoder for the given subset of fields, which builds records holding only 
+        those fields (plus 'deleted' and 'offset') and touches only their bytes.
+        Records of a projection are small, so they are decoded at once instead of lazily.
+        Projections are built once for each list of names.
+
+        :param names: Names of the fields, as found in the records.
+        """
+        key = tuple(names)
+        decoder = self.projections.get(key)
+        if decoder is None:
+            decoder = copy(self)
+            decoder.names = list(key)
+            decoder.items = [(name, *self.fields_by_name[name]) for name in key]
+            decoder.converters = [convert for _, convert, _, _ in decoder.items]
+            decoder.offsets = [(start, end) for _, _, start, end in decoder.items]
+            decoder.fields_by_name = {name: self.fields_by_name[name] for name in key}
+            decoder.lazy = False
+            decoder.projections = {}
+            self.projections[key] = decoder
+        return decoder
+
+    @staticmethod
+    def _unknown(fieldtype):
+        def convert(content):
+            raise ValueError(f"Unknown field type {fieldtype}")
+        return convert
+
+    def __call__(self, rec_bytes, offset=0):
+        """
+        Decodes the bytes of a record (bytes, bytearray or memoryview) into a LazyRecord,
+        whose fields are converted as they are accessed.
+
+        :param rec_bytes: Raw bytes of the record, starting with the deletion flag.
+        :param offset: Offset of the record in the file, stored in the 'offset' key.
+        """
+        if not self.lazy:
+            return self._decode(str(rec_bytes, 'latin1'), 0, offset)
+        return LazyRecord(self, str(rec_bytes, 'latin1'), offset)
+
+    def decode(self, rec_bytes, offset=0):
+        """
+        Decodes the bytes of a record (bytes, bytearray or memoryview) into a Record, 
+        converting every field at once.
+
+        :param rec_bytes: Raw bytes of the record, starting with the deletion flag.
+        :param offset: Offset of the record in the file, stored in the 'offset' key.
+        """
+        return self._decode(str(rec_bytes, 'latin1'), 0, offset)
+
+    def decode_field(self, text, name):
+        """
+        Converts a single field out of the text of a record (see LazyRecord).
+
+        :param text: Text of the raw record, starting with the deletion flag.
+        :param name: Name of the field.
+        """
+        convert, start, end = self.fields_by_name[name]
+        content = text[start:end]
+        if '\x00' in content:
+            return convert(content.strip("\x00").strip().replace('\x00', ' '))
+        return convert(content.strip())
+
+    def decode_many(self, buffer, offset=0):
+        """
+        Returns a generator of LazyRecords out of a buffer holding several consecutive records.
+        The whole buffer is decoded to text at once and the text of each record is sliced out of it 
+        as it is consumed; fields are converted as they are accessed.
+        Trailing bytes not making up a whole record are ignored.
+
+        :param buffer: Raw bytes of the records (bytes, bytearray or memoryview).
+        :param offset: Offset in the file of the first record in the buffer.
+        """
+        text = str(buffer, 'latin1')
+        size = self.record_size
+        if not self.lazy:
+            for base in range(0, len(text) - size + 1, size):
+                yield self._decode(text, base, offset + base)
+            return
+        for base in range(0, len(text) - size + 1, size):
+            yield LazyRecord(self, text[base:base + size], offset + base)
+
+    def decode_columns(self, buffer):
+        """
+        Decodes a buffer holding several consecutive records into columns: a list of values for 
+        each field, plus the list of deletion flags, without building a Record for each row.
+
+        :param buffer: Raw bytes of the records (bytes, bytearray or memoryview).
+        :return: Tuple (deleted, columns), columns being a list with one list of values per field.
+        """
+        text = str(buffer, 'latin1')
+        size = self.record_size
+        bases = range(0, len(text) - size + 1, size)
+        deleted = [text[base] == '*' for base in bases]
+        columns = []
+        if '\x00' in text:
+            for _, convert, start, end in self.items:
+                columns.append([convert(text[base + start:base + end].strip("\x00").strip().replace('\x00', ' ')) 
+                                for base in bases])
+        else:
+            for _, convert, start, end in self.items:
+                columns.append([convert(text[base + start:base + end].strip()) for base in bases])
+        return deleted, columns
+
+    def _decode(self, text, base, offset):
+        record = Record({'deleted': text[base] == '*', 'offset': offset})
+        self._fill(record, text, base)
+        return record
+
+    def _fill(self, record, text, base):
+        """
+        Converts every field of the record starting at 'base' in 'text' into 'record'.
+        Meant for internal use only.
+        """
+        if text.find('\x00', base, base + self.record_size) >= 0 and any(
+                text.find('\x00', base + start, base + end) >= 0 for _, _, start, end in self.items):
+            for name, convert, start, end in self.items:
+                record[name] = convert(text[base + start:base + end].strip("\x00").strip().replace('\x00', ' '))
+        else:
+            for name, convert, start, end in self.items:
+                record[name] = convert(text[base + start:base + end].strip())
+
+
+def _encoder_character(field):
+    length = field.length
+    def encode(value):
+        if value is None:
+            return b' ' * length
+        return str(value).encode('latin1')[:length].ljust(length, b' ')
+    return encode
+
+def _encoder_numeric(field):
+    length, decimal = field.length, field.decimal
+    def encode(value):
+        if value is None or value == '':
+            return b' ' * length
+        if decimal and isinstance(value, (int, float)) and not isinstance(value, bool):
+            encoded = f"{value:.{decimal}f}".encode('latin1')
+        else:
+            encoded = str(value).encode('latin1')
+        if len(encoded) > length:
+            raise ValueError(f"Value {value} too long for field {field.name}")
+        return encoded.rjust(length, b' ')
+    return encode
+
+def _encoder_date(field):
+    length = field.length
+    def encode(value):
+        if isinstance(value, date):
+            return value.strftime('%Y%m%d').encode('latin1').ljust(length, b' ')
+        # Blank or invalid dates, as decoded, are written back as they were
+        return ('' if value is None else str(value)).encode('latin1')[:length].ljust(length, b' ')
+    return encode
+
+def _encoder_logical(field):
+    length = field.length
+    def encode(value):
+        if value is None:
+            return b'?'.ljust(length, b' ')
+        if isinstance(value, str):
+            value = value.strip()[:1] in ('T', 't', 'Y', 'y')
+        return (b'T' if value else b'F').ljust(length, b' ')
+    return encode
+
+def _encoder_memo(field, memo):
+    length = field.length
+    def encode(value):
+        if value is None or value == '':
+            block = 0
+        elif isinstance(value, Memo) and (value.dbt is memo or not value.block):
+            block = value.block
+        elif isinstance(value, int) and not isinstance(value, bool):
+            block = value
+        elif memo is None:
+            raise FileNotFoundError(f"Memo file not found for field {field.name}")
+        else:
+            # New text (or a memo from another file) goes to new blocks
+            block = memo.write(str(value))
+        return (str(block) if block else '').rjust(length).encode('latin1')
+    return encode
+
+_encoders = {
+    FieldType.CHARACTER.value: _encoder_character,
+    FieldType.NUMERIC.value: _encoder_numeric,
+    FieldType.FLOAT.value: _encoder_numeric,
+    FieldType.DATE.value: _encoder_date,
+    FieldType.LOGICAL.value: _encoder_logical,
+}
+
+
+class RecordEncoder:
+    """
+    Record encoder compiled once for the fields of a database, the counterpart of RecordDecoder.
+    Produces the full bytes of a record (deletion flag included) at once, so that each record
+    is written with a single write, the same way by add_record, add_records and save_record
+    (commit and pack copy the raw bytes of the records).
+    Text is encoded as latin1: characters it can't represent raise UnicodeEncodeError.
+    """
+
+    def __init__(self, fields: List[DbaseField], record_size: int, memo=None):
+        """
+        :param fields: List of DbaseField objects describing the record.
+        :param record_size: Size in bytes of each record, including the deletion flag.
+        :param memo: DbtFile holding the memos, for databases with memo fields.
+        """
+        self.record_size = record_size
+        self.names = [field.name.strip() for field in fields]
+        self.encoders = [_encoder_memo(field, memo) if field.type == FieldType.MEMO.value
+                         else _encoders[field.type](field) if field.type in _encoders else self._unknown(field.type) 
+                         for field in fields]
+
+    @staticmethod
+    def _unknown(fieldtype):
+        def encode(value):
+            raise ValueError(f"Unknown field type {fieldtype}")
+        return encode
+
+    def encode(self, values, deleted=False):
+        """
+        Returns the bytes of a record, given its values in field order.
+        """
+        parts = [b'*' if deleted else b' ']
+        parts.extend(encode(value) for encode, value in zip(self.encoders, values))
+        return b''.join(parts).ljust(self.record_size, b' ')
+
+    def encode_record(self, record):
+        """
+        Returns the bytes of a record, given a dictionary with field names and field values
+        (and optionally the 'deleted' flag).
+        """
+        return self.encode([record[name] for name in self.names], record.get('deleted'))
+
+
+class IndexKey:
+    """
+    Builds index keys out of records, following the key expression of an index file.
+    Supported expressions are a field name ('AGE'), several character fields concatenated
+    ('LAST+FIRST') and any of the latter folded to upper case ('UPPER(LAST+FIRST)').
+    Numeric and date keys are made of a single field.
+    """
+
+    def __init__(self, expression: str, fields: List[DbaseField]):
+        """
+        :param expression: Key expression of the index.
+        :param fields: Fields of the database the index belongs to.
+        :raises ValueError: If the expression is not supported or refers to unknown fields.
+        """
+        expr = expression.strip().upper().replace(' ', '')
+        self.upper = expr.startswith('UPPER(') and expr.endswith(')')
+        if self.upper:
+            expr = expr[6:-1]
+        by_name = {field.name.strip().upper(): field for field in fields}
+        self.names, self.lengths, types = [], [], []
+        for name in expr.split('+'):
+            if name not in by_name:
+                raise ValueError(f"Unsupported index expression {expression}")
+            field = by_name[name]
+            self.names.append(field.name.strip())
+            self.lengths.append(field.length)
+            types.append(field.type)
+        self.type = types[0]
+        self.numeric = self.type != FieldType.CHARACTER.value
+        if self.numeric and (len(types) > 1 or self.upper or 
+                             self.type not in (FieldType.NUMERIC.value, FieldType.FLOAT.value, FieldType.DATE.value)):
+            raise ValueError(f"Unsupported index expression {expression}")
+        if not self.numeric and any(t != FieldType.CHARACTER.value for t in types):
+            raise ValueError(f"Unsupported index expression {expression}")
+        self.key_length = 8 if self.numeric else sum(self.lengths)
+
+    @staticmethod
+    def _number(value):
+        if isinstance(value, date):
+            return float(value.toordinal() + 1721425)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        return None
+
+    def key_of(self, record):
+        """
+        Returns the key of a decoded record.
+        """
+        if self.numeric:
+            key = self._number(record[self.names[0]])
+            return 0.0 if key is None else key
+        key = ''.join(str(record[name]).ljust(length)[:length] for name, length in zip(self.names, self.lengths))
+        key = key.encode('latin1', 'replace')
+        return fold_upper(key) if self.upper else key
+
+    def query(self, value):
+        """
+        Returns the key to look up for a search on the first field of the index:
+        a number for numeric and date indexes, a prefix (bytes) for character ones,
+        or None if the value cannot be looked up in this index.
+        """
+        if self.numeric:
+            return self._number(value)
+        if not isinstance(value, str) or not self.upper:
+            return None
+        return fold_upper(value.encode('latin1', 'replace'))
+
+
+class HashIndex:
+    """
+    In memory index mapping each value of a field to the (sorted) list of indexes of the records holding it.
+    Character values are stored lower cased, along with a sorted list of the distinct values,
+    so that case insensitive prefix lookups (istartswith) can be served as well as exact ones.
+    """
+
+    def __init__(self, fieldname: str, fieldtype: str):
+        """
+        :param fieldname: Name of the indexed field.
+        :param fieldtype: Type of the indexed field.
+        """
+        self.fieldname = fieldname
+        self.char = fieldtype == FieldType.CHARACTER.value
+        self.map = {}
+        self._keys = None
+
+    def __len__(self):
+        return len(self.map)
+
+    def _key(self, value):
+        return value.lower() if self.char and isinstance(value, str) else value
+
+    def add(self, value, index: int):
+        """
+        Adds the record at 'index', holding 'value' in the indexed field.
+        """
+        key = self._key(value)
+        indexes = self.map.get(key)
+        if indexes is None:
+            self.map[key] = [index]
+            self._keys = None
+        else:
+            insort(indexes, index)
+
+    def remove(self, value, index: int):
+        """
+        Removes the record at 'index', holding 'value' in the indexed field.
+        """
+        key = self._key(value)
+        indexes = self.map.get(key)
+        if indexes and index in indexes:
+            indexes.remove(index)
+            if not indexes:
+                del self.map[key]
+                self._keys = None
+
+    def lookup(self, value):
+        """
+        Returns the sorted list of indexes of the records holding exactly 'value' 
+        (case insensitive for character fields).
+        """
+        try:
+            return list(self.map.get(self._key(value), []))
+        except TypeError:
+            return []
+
+    def startswith(self, prefix: str):
+        """
+        Returns the sorted list of indexes of the records whose value starts with 'prefix',
+        ignoring case (character fields only).
+        """
+        if self._keys is None:
+            self._keys = sorted(key for key in self.map if isinstance(key, str))
+        prefix = prefix.lower()
+        ret = []
+        for i in range(bisect_left(self._keys, prefix), len(self._keys)):
+            if not self._keys[i].startswith(prefix):
+                break
+            ret.extend(self.map[self._keys[i]])
+        return sorted(ret)
+
+
+class RecordCache:
+    """
+    Bounded LRU cache of decoded records, keyed by record index.
+    The size of each entry is reckoned as the size of the record in the file,
+    so that max_bytes bounds the amount of record data held.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = None, record_size: int = 0):
+        """
+        :param max_entries: Maximum number of records held.
+        :param max_bytes: Maximum amount of record data held, if not None.
+        :param record_size: Size in bytes of each record.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.record_size = record_size
+        self.records = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __str__(self):
+        return f"RecordCache(entries={len(self)}, hits={self.hits}, misses={self.misses})"
+
+    @property
+    def capacity(self):
+        """
+        Maximum number of records held, accounting for max_bytes.
+        """
+        if self.max_bytes is None or not self.record_size:
+            return self.max_entries
+        return min(self.max_entries, self.max_bytes // self.record_size)
+
+    def get(self, key):
+        """
+        Returns the record cached for 'key', marking it as the most recently used, or None.
+        """
+        with self.lock:
+            record = self.records.get(key)
+            if record is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.records.move_to_end(key)
+            return record
+
+    def put(self, key, record):
+        """
+        Caches a record, evicting the least recently used ones past capacity.
+        """
+        capacity = self.capacity
+        if capacity <= 0:
+            return
+        with self.lock:
+            self.records[key] = record
+            self.records.move_to_end(key)
+            while len(self.records) > capacity:
+                self.records.popitem(last=False)
+
+    def discard(self, key):
+        """
+        Drops the record cached for 'key', if any.
+        """
+        with self.lock:
+            self.records.pop(key, None)
+
+    def clear(self):
+        """
+        Drops all the cached records. Hit and miss counters are kept.
+        """
+        with self.lock:
+            self.records.clear()
+
+
+class RecordsView(Sequence):
+    """
+    Lazy view over a range of records in a DbaseFile, as returned by slicing it.
+    Records are read and decoded only as the view is iterated or indexed, 
+    so that slicing costs nothing until it is consumed.
+    """
+
+    def __init__(self, dbf, indexes: range, fields=None):
+        """
+        :param dbf: DbaseFile the records belong to.
+        :param indexes: Range of record indexes covered by the view.
+        :param fields: Names of the fields to read, or None for all of them.
+        """
+        self.dbf = dbf
+        self.indexes = indexes
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return RecordsView(self.dbf, self.indexes[key], self.fields)
+        return self.dbf.get_record(self.indexes[key], self.fields)
+
+    def __iter__(self):
+        indexes = self.indexes
+        if not indexes:
+            return
+        if indexes.step > 0:
+            records = self.dbf.iter_records(indexes.start, indexes[-1] + 1, fields=self.fields)
+            yield from islice(records, 0, None, indexes.step)
+        else:
+            for i in indexes:
+                yield self.dbf.get_record(i, self.fields)
+
+    def __eq__(self, other):
+        if isinstance(other, (RecordsView, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def _parallel_task(filename, start, stop, task):
+    """
+    Runs a task of DbaseFile.parallel_map or DbaseFile.parallel_filter on the records in the 
+    range [start, stop), in a worker process opening (and memory mapping) the file on its own.
+    Meant for internal use only.
+    """
+    dbf = DbaseFile(filename, use_mmap=True)
+    try:
+        kind = task[0]
+        if kind == 'map':
+            func = task[1]
+            return [func(record) for record in dbf.iter_records(start, stop)]
+        elif kind == 'where':
+            _, fieldname, op, value = task
+            return [record for _, record in dbf.where(fieldname, op, value, start, stop)]
+        elif kind == 'filter':
+            _, fieldname, value, comp_func = task
+            fieldname = dbf.get_field(fieldname).name.strip()
+            return [record for record in dbf.iter_records(start, stop) if comp_func(record[fieldname], value)]
+        raise ValueError(f"Unknown task {kind}")
+    finally:
+        dbf._unmap()
+        dbf.file.close()
+
+
+def _writer(method):
+    """
+    Decorator serializing the methods which write to a DbaseFile, through its lock.
+    Meant for internal use only.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class _FileLocks:
+    """
+    Byte range locks (fcntl) on a database file, coordinating the threads of this process
+    with each other as well as with other processes.
+    Where open file description locks are available (Linux), each lock is taken through a
+    descriptor of its own, so that the locks of different threads conflict as those of different
+    processes do. Otherwise record locks belong to the process, and a thread releasing a range
+    would release it for every thread: readers then share one lock on the whole file, taken by
+    the first and released by the last, and writers wait for them to leave before locking a range.
+    Meant for internal use only.
+
+    Methods:
+        __init__(self, filename: str, fd: int)
+        locked(self, offset: int, length: int, exclusive: bool = False)
+        close(self)
+    """
+
+    def __init__(self, filename: str, fd: int):
+        """
+        :param filename: Name of the database file, to open descriptors for locking.
+        :param fd: Descriptor of the open database file.
+        """
+        self.filename = filename
+        self.fd = fd
+        self.ofd = hasattr(fcntl, 'F_OFD_SETLKW')
+        self.descriptors = []
+        self.condition = Condition()
+        self.readers = 0
+        self.writers = 0
+        self.writing = False
+
+    @staticmethod
+    def _ofd_lock(fd, locktype, offset, length):
+        """
+        Takes, or releases if locktype is F_UNLCK, an open file description lock on a range.
+        """
+        # struct flock: l_type, l_whence, l_start, l_len, l_pid (0 for open file description locks)
+        fcntl.fcntl(fd, fcntl.F_OFD_SETLKW, struct.pack('hhqqi', locktype, os.SEEK_SET, offset, length, 0))
+
+    @contextmanager
+    def locked(self, offset: int, length: int, exclusive: bool = False):
+        """
+        Holds a lock on 'length' bytes at 'offset' (shared, or exclusive if 'exclusive' is True)
+        while the block runs.
+        """
+        if self.ofd:
+            with self.condition:
+                fd = self.descriptors.pop() if self.descriptors else os.open(self.filename, os.O_RDWR)
+            try:
+                self._ofd_lock(fd, fcntl.F_WRLCK if exclusive else fcntl.F_RDLCK, offset, length)
+                try:
+                    yield
+                finally:
+                    self._ofd_lock(fd, fcntl.F_UNLCK, offset, length)
+            finally:
+                with self.condition:
+                    self.descriptors.append(fd)
+        elif exclusive:
+            with self.condition:
+                self.writers += 1
+                try:
+                    self.condition.wait_for(lambda: not self.readers and not self.writing)
+                finally:
+                    self.writers -= 1
+                self.writing = True
+            try:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX, length, offset, os.SEEK_SET)
+                try:
+                    yield
+                finally:
+                    fcntl.lockf(self.fd, fcntl.LOCK_UN, length, offset, os.SEEK_SET)
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+        else:
+            with self.condition:
+                # Waiting writers go first, so that a stream of readers doesn't starve them
+                self.condition.wait_for(lambda: not self.writers and not self.writing)
+                if not self.readers:
+                    fcntl.lockf(self.fd, fcntl.LOCK_SH, 0, 0, os.SEEK_SET)
+                self.readers += 1
+            try:
+                yield
+            finally:
+                with self.condition:
+                    self.readers -= 1
+                    if not self.readers:
+                        fcntl.lockf(self.fd, fcntl.LOCK_UN, 0, 0, os.SEEK_SET)
+                        self.condition.notify_all()
+
+    def close(self):
+        """
+        Closes the descriptors opened for locking.
+        """
+        with self.condition:
+            while self.descriptors:
+                os.close(self.descriptors.pop())
+
+
+class BulkAppender:
+    """
+    Appends records to a DbaseFile in blocks: rows are encoded into a preallocated buffer, 
+    which is written at once when full. The header (records count and date of last update) 
+    is written only once, when the appender is closed. Meant to be used as a context manager 
+    (see DbaseFile.bulk_append); records already written are kept even if the block raises.
+    """
+
+    def __init__(self, dbf, chunk_size: int = 4096):
+        """
+        :param dbf: DbaseFile to append records to.
+        :param chunk_size: Number of records buffered before each write.
+        """
+        self.dbf = dbf
+        self.chunk_size = max(chunk_size, 1)
+        self.record_size = dbf.header.record_size
+        self.buffer = bytearray(self.chunk_size * self.record_size)
+        self.count = 0
+        self.added = 0
+        self.first = dbf.header.records
+        self.names = [field.name.strip() for field in dbf.fields]
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def add_record(self, *data):
+        """
+        Adds a record, given its values in field order.
+        """
+        if self.closed:
+            raise ValueError("Appender is closed")
+        if len(data) != len(self.names):
+            raise ValueError("Wrong number of fields")
+        position = self.count * self.record_size
+        self.buffer[position:position + self.record_size] = self.dbf.encoder.encode(data)
+        self.count += 1
+        if self.count == self.chunk_size:
+            self.flush()
+
+    def add_records(self, rows):
+        """
+        Adds records out of an iterable of sequences of values (in field order)
+        or dictionaries with field names and field values.
+        """
+        for row in rows:
+            if isinstance(row, Mapping):
+                row = [row[name] for name in self.names]
+            self.add_record(*row)
+
+    def add_encoded(self, data):
+        """
+        Adds records already encoded (as by RecordEncoder.encode, deletion flags included), 
+        given as a bytes-like object holding a whole number of records. They are written 
+        at once, after any buffered records.
+        """
+        if self.closed:
+            raise ValueError("Appender is closed")
+        count, extra = divmod(len(data), self.record_size)
+        if extra:
+            raise ValueError("Data is not a whole number of records")
+        self.flush()
+        self._append(memoryview(data), count)
+
+    def flush(self):
+        """
+        Writes the buffered records to the file.
+        """
+        if not self.count:
+            return
+        self._append(memoryview(self.buffer)[:self.count * self.record_size], self.count)
+        self.count = 0
+
+    def _append(self, view, count):
+        """
+        Writes 'count' encoded records at the end of the file.
+        Meant for internal use only.
+        """
+        if not count:
+            return
+        dbf = self.dbf
+        with dbf.lock:
+            dbf._write_at(dbf.header.header_size + dbf.header.records * self.record_size, view)
+            dbf.header.records += count
+            if dbf.deletion_flags is not None:
+                dbf.deletion_flags.extend(view[::self.record_size].tobytes())
+            dbf.filesize = dbf.header.header_size + self.record_size * dbf.header.records
+            dbf.datasize = self.record_size * dbf.header.records
+            self.added += count
+
+    def close(self):
+        """
+        Writes any buffered records and then the header, and updates the open indexes.
+        """
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        dbf = self.dbf
+        if not self.added:
+            return
+        with dbf.lock:
+            dbf._touch()
+            dbf._write_header()
+            if dbf.indexes or dbf.hash_indexes:
+                for i, record in enumerate(dbf.iter_records(self.first), self.first):
+                    dbf._update_indexes(i, None, record)
+
+
+class Batch:
+    """
+    Write-behind buffer for updates to existing records (see DbaseFile.batch).
+    While active, save_record (thus update_record and del_record) keeps the encoded records
+    in memory, keyed by record number, and reads of the database see them. When the block ends 
+    they are written sorted by offset, contiguous records with a single write, the header is 
+    written once and, optionally, the file is synced to disk once. If the block raises, 
+    the buffered changes are discarded. Records added with add_record are written at once
+    and are not rolled back.
+    """
+
+    def __init__(self, dbf, fsync: bool = False):
+        """
+        :param dbf: DbaseFile whose updates are buffered.
+        :param fsync: If True, the file is synced to disk (os.fsync) when the batch is written.
+        """
+        self.dbf = dbf
+        self.fsync = fsync
+        self.records = {}
+        self.old_records = {}
+
+    def __enter__(self):
+        if self.dbf.batch_writer is not None:
+            raise ValueError("A batch is already in progress")
+        self.dbf.batch_writer = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def put(self, key: int, data: bytes, old_record=None):
+        """
+        Buffers the encoded bytes of record 'key'. 'old_record' is the record as found on disk,
+        kept the first time the record is buffered to update the indexes when written.
+        """
+        self.records[key] = data
+        if key not in self.old_records:
+            self.old_records[key] = old_record
+
+    def patch(self, start: int, stop: int, data: bytes):
+        """
+        Returns 'data', the raw records in the range [start, stop), with the buffered records applied.
+        """
+        if stop - start < len(self.records):
+            keys = [key for key in range(start, stop) if key in self.records]
+        else:
+            keys = [key for key in self.records if start <= key < stop]
+        if not keys:
+            return data
+        size = self.dbf.header.record_size
+        data = bytearray(data)
+        for key in keys:
+            position = (key - start) * size
+            data[position:position + size] = self.records[key]
+        return bytes(data)
+
+    def flush(self):
+        """
+        Writes the buffered records to the file, sorted by offset, and updates the open indexes.
+        """
+        if not self.records:
+            return
+        dbf = self.dbf
+        with dbf.lock:
+            size = dbf.header.record_size
+            keys = sorted(self.records)
+            run = [keys[0]]
+            for key in chain(keys[1:], [None]):
+                if key is not None and key == run[-1] + 1:
+                    run.append(key)
+                    continue
+                dbf._write_at(dbf.header.header_size + run[0] * size, b''.join(self.records[k] for k in run))
+                run = [key]
+            dbf.file.flush()
+            records, old_records = self.records, self.old_records
+            self.records, self.old_records = {}, {}
+            if dbf.indexes or dbf.hash_indexes:
+                for key in keys:
+                    offset = dbf.header.header_size + key * size
+                    dbf._update_indexes(key, old_records[key], dbf.decoder(records[key], offset))
+
+    def commit(self):
+        """
+        Writes the buffered records and the header, and ends the batch.
+        """
+        dbf = self.dbf
+        try:
+            written = bool(self.records)
+            self.flush()
+            if written:
+                with dbf.lock:
+                    dbf._touch()
+                    dbf._write_header()
+            if self.fsync:
+                os.fsync(dbf.file.fileno())
+        finally:
+            dbf.batch_writer = None
+
+    def rollback(self):
+        """
+        Discards the buffered records and ends the batch.
+        """
+        self.records.clear()
+        self.old_records.clear()
+        self.dbf.batch_writer = None
+        # Deletion flags were updated along with the buffered records
+        self.dbf.deletion_flags = None
+
+
 class DbaseFile:
     """
     Class to manipulate DBase III database files (read and write).
@@ -156,15 +1276,34 @@ class DbaseFile:
         iendswith(f: str, v: str) -> bool
         create(cls, filename: str, fields: List[Tuple[str, FieldType, int, int]])
         add_record(self, record_data: dict)
+        add_records(self, rows, chunk_size=4096)
+        bulk_append(self, chunk_size=4096)
+        batch(self, fsync=False)
         update_record(self, index: int, record_data: dict)
         del_record(self, key, value = True)
-        get_record(self, key)
+        get_record(self, key, fields=None)
+        iter_records(self, start=0, stop=None, chunk_size=1024, fields=None)
+        iter_live(self, start=0, stop=None, chunk_size=1024, fields=None)
+        live_count(self)
         get_field(self, fieldname)
+        finditer(self, fieldname, value, start=0, comp_func=None)
+        where(self, fieldname, op, value, start=0, stop=None, chunk_size=65536)
         search(self, fieldname, value, start=0, funcname="", comp_func=None)
         find(self, fieldname, value, start=0, comp_func=None)
         index(self, fieldname, value, start=0, comp_func=None)
         filter(self, fieldname, value, comp_func=None)
+        parallel_map(self, func, start=0, stop=None, workers=None)
+        parallel_filter(self, fieldname, value, comp_func=None, workers=None)
+        create_index(self, fieldnames, filename=None, upper=True)
+        open_index(self, filename)
+        close_index(self, filename)
+        reindex(self)
+        set_cache(self, max_entries=1024, max_bytes=None)
+        build_index(self, fieldname)
+        drop_index(self, fieldname)
         save_record(self, key, record)
+        commit(self, filename=None, chunk_size=4096)
+        pack(self, chunk_size=4096)
         write(self)
     """
     
@@ -198,12 +1337,16 @@ class DbaseFile:
 
         :param filename: Name of the file to create.
         :param fields: List of tuples describing the fields (name, type, length, decimals).
+                       Memo fields (type M, length 10) are kept in a memo file (.dbt) created along.
         :raises FileExistsError: If the file already exists.
         """
         if os.path.exists(filename):
             raise FileExistsError(f"File {filename} already exists")
+        memo = any(field[1] == FieldType.MEMO.value for field in fields)
         with open(filename, 'wb') as file:
             header = DbaseHeader()
+            if memo:
+                header.version = 0x83
             header.header_size = 32 + 32 * len(fields) + 1
             header.record_size = sum(field[2] for field in fields) + 1
             file.write(header.to_bytes())
@@ -213,31 +1356,62 @@ class DbaseFile:
                 field = DbaseField(name, ftype, 0, length, decimal)
                 file.write(field.to_bytes())
             file.write(b'\x0D')
+        if memo:
+            base, ext = os.path.splitext(filename)
+            DbtFile.create(base + ('.DBT' if ext.isupper() else '.dbt')).close()
         dbf = cls(filename)
         return dbf
 
-    def __init__(self, filename):
+    def __init__(self, filename, use_mmap=False, indexes=None, thread_safe=False):
         """
         Initializes an instance of DBase3.
 
         :param filename: Name of the database file.
-        """
-        self.lock = Lock()
+        :param use_mmap: If True, records are read from a memory mapped view of the file
+                         instead of issuing a seek and a read for each record.
+        :param indexes: List of index files (.ndx) to open along with the database.
+        :param thread_safe: If True, records are read and written with positional I/O (os.pread
+                            and os.pwrite), so that many threads can read at once without sharing
+                            a file position, and byte range locks (fcntl) are held while reading 
+                            and writing, to coordinate with other processes. use_mmap is ignored.
+        """
+        self.lock = RLock()
         self.filename = filename
         self.filesize = os.path.getsize(filename)
         self.file = open(filename, 'r+b')
-        # self.memfile = memmap(self.file.fileno(), 0, access=ACCESS_WRITE)
+        self.thread_safe = thread_safe and hasattr(os, 'pread')
+        self.use_mmap = use_mmap and not thread_safe
+        self.locks = None
+        self._open_locks()
+        self.memfile = None
+        self.memview = None
         self.num_fields = 0
         self.fields = []
         self.header = None
+        self.decoder = None
+        self.encoder = None
         self.datasize = 0
+        self.indexes = {}
+        self.hash_indexes = {}
+        self.cache = None
+        self.batch_writer = None
+        self.memo = None
+        self.deletion_flags = None
         self. _init()
+        self._map()
+        for index in indexes or []:
+            self.open_index(index)
 
     def __del__(self):
         """
         Closes the database file when the instance is destroyed.
         """
+        self._unmap()
+        if getattr(self, 'locks', None) is not None:
+            self.locks.close()
         self.file.close()
+        if self.memo is not None:
+            self.memo.close()
 
     def __len__(self):
         """
@@ -248,74 +1422,172 @@ class DbaseFile:
     def __getitem__(self, key):
         """
         Returns from the database a single record (dictionary with field names and field values) 
-        or a list of them (if a slice is used).
+        or a lazy view over a range of them (if a slice is used).
+        A list of field names may follow the index or slice, to read only those fields:
+        dbf[3, ['name', 'age']] or dbf[10:20, ['name']].
         """
+        fields = None
+        if isinstance(key, tuple):
+            key, fields = key
         if isinstance(key, slice):
-            start = key.start or 0
-            stop = key.stop or self.header.records
-            step = key.step or 1
-            if start < 0:
-                start += self.header.records + 1
-            if stop < 0:
-                stop += self.header.records + 1
-            if stop < start:
-                if step > 0:
-                    step = -step
-            elif stop > start:
-                if step < 0:
-                    step = -step    
-            else:
-                return []
-            if stop > self.header.records:
-                stop = self.header.records
-
-            return [self.get_record(i) for i in range(start, stop, step)]
+            return RecordsView(self, range(self.header.records)[key], fields)
         else:
             if -self.header.records > key or key >= self.header.records:
                 raise IndexError("Record index out of range")
             if key < 0:
                 key += self.header.records 
-            return self.get_record(key)
+            return self.get_record(key, fields)
 
     def __iter__(self):
         """
         Returns an iterator over the records in the database, 
         allowing notation like 'for record in dbf'.
         """
-        self.file.seek(self.header.header_size)
-        return iter(self.get_record(i) for i in range(self.header.records))
+        return self.iter_records()
         
     def __str__(self):
         """
         Returns a string with information about the database file.
         """
-        lastmodified = datetime.strftime(datetime(1900 + self.header.year, self.header.month, self.header.day), '%Y-%m-%d')
-        return f"""
-        File version: {self.header.version}
-        File name: {self.filename}
-        File size; {self.filesize}
-        Last Modified: {lastmodified}
-        Header Size: {self.header.header_size}
-        Record Size: {self.header.record_size}
-        Records: {self.header.records}
-"""
-    
-    def _init(self):
+        lastmodified = datetime.strftime(datetime(1900 + self.header.year, self.header.month, self.header.day), '%Y-%m-%d')
+        return f"""
+        File version: {self.header.version}
+        File name: {self.filename}
+        File size; {self.filesize}
+        Last Modified: {lastmodified}
+        Header Size: {self.header.header_size}
+        Record Size: {self.header.record_size}
+        Records: {self.header.records}
+"""
+    
+    def _init(self):
+        """
+        Initializes the database structure by reading the header and fields.
+        """
+        self.header = DbaseHeader()
+        self.header.load_bytes(self.file.read(32))
+        self.num_fields = (self.header.header_size - 32) // 32
+        self.datasize = self.header.record_size * self.header.records
+        for i in range(self.num_fields):
+            raw_bytes = self.file.read(32)
+            field = DbaseField()
+            field.load_bytes(raw_bytes)
+            if not field.name:  # Stop if the field name is empty
+                break
+            self.fields.append(field)
+        if self.memo is None and FieldType.MEMO.value in self.field_types:
+            filename = self._memo_filename()
+            if os.path.exists(filename):
+                self.memo = DbtFile(filename, self.use_mmap)
+        self.decoder = RecordDecoder(self.fields, self.header.record_size, self.memo)
+        self.encoder = RecordEncoder(self.fields, self.header.record_size, self.memo)
+        # assert(self.header.header_size + self.datasize == self.filesize)
+
+    def _map(self):
+        """
+        (Re)maps the database file in memory, if the instance was opened with use_mmap=True.
+        Called when the file is opened, and by _read_at when a read goes past the mapped size,
+        so that records added since are mapped only when they are read.
+        Meant for internal use only.
+        """
+        self._unmap()
+        if not self.use_mmap:
+            return
+        self.file.flush()
+        self.memfile = memmap(self.file.fileno(), 0, access=ACCESS_READ)
+        self.memview = memoryview(self.memfile)
+
+    def _unmap(self):
+        """
+        Releases the memory mapped view of the database file, if any.
+        Meant for internal use only.
+        """
+        if getattr(self, 'memview', None) is not None:
+            self.memview.release()
+            self.memview = None
+        if getattr(self, 'memfile', None) is not None:
+            try:
+                self.memfile.close()
+            except BufferError:
+                # Slices handed out by _read_at are still alive: the map is closed once they are released
+                pass
+            self.memfile = None
+
+    def _memo_filename(self, filename=None):
+        """
+        Returns the name of the memo file (.dbt) of the database, or of the database 'filename',
+        matching the case of its extension.
+        Meant for internal use only.
+        """
+        base, ext = os.path.splitext(filename or self.filename)
+        return base + ('.DBT' if ext.isupper() else '.dbt')
+
+    def _open_locks(self):
+        """
+        Sets up the byte range locks on the (re)opened file, if the instance is thread safe
+        and fcntl is available, closing those of the previous file.
+        Meant for internal use only.
+        """
+        if self.locks is not None:
+            self.locks.close()
+            self.locks = None
+        if self.thread_safe and fcntl is not None:
+            self.locks = _FileLocks(self.filename, self.file.fileno())
+
+    @contextmanager
+    def _locked(self, offset, length, exclusive=False):
+        """
+        Holds a byte range lock on the file (shared, or exclusive if 'exclusive' is True) 
+        while the block runs, if the instance is thread safe and fcntl is available.
+        See _FileLocks.
+        Meant for internal use only.
+        """
+        if self.locks is None:
+            yield
+            return
+        with self.locks.locked(offset, length, exclusive):
+            yield
+
+    def _read_at(self, offset, length):
+        """
+        Reads 'length' bytes at 'offset': a slice of the memory mapped view (a memoryview, not a copy),
+        if any, a positional read (which doesn't move the file position) if thread safe, or else 
+        a seek and a read. The file is mapped again when the read goes past the mapped size.
+        Meant for internal use only.
+        """
+        if self.memview is not None:
+            if offset + length > len(self.memview):
+                self._map()
+            return self.memview[offset:offset + length]
+        if self.thread_safe:
+            with self._locked(offset, length):
+                return os.pread(self.file.fileno(), length, offset)
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def _write_at(self, offset, data):
+        """
+        Writes 'data' at 'offset', with a positional write if thread safe, or else a seek and a write.
+        Callers hold self.lock.
+        Meant for internal use only.
+        """
+        if not self.thread_safe:
+            self.file.seek(offset)
+            self.file.write(data)
+            return
+        with self._locked(offset, len(data), exclusive=True):
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(self.file.fileno(), view, offset)
+                view, offset = view[written:], offset + written
+
+    def _write_header(self):
         """
-        Initializes the database structure by reading the header and fields.
+        Writes the header to the file.
+        Meant for internal use only.
         """
-        self.header = DbaseHeader()
-        self.header.load_bytes(self.file.read(32))
-        self.num_fields = (self.header.header_size - 32) // 32
-        self.datasize = self.header.record_size * self.header.records
-        for i in range(self.num_fields):
-            raw_bytes = self.file.read(32)
-            field = DbaseField()
-            field.load_bytes(raw_bytes)
-            if not field.name:  # Stop if the field name is empty
-                break
-            self.fields.append(field)
-        # assert(self.header.header_size + self.datasize == self.filesize)
+        self._write_at(0, self.header.to_bytes())
+        self.file.flush()
 
     @property
     def field_names(self):
@@ -377,59 +1649,139 @@ class DbaseFile:
                 res.append(result)
         return res
 
-    def commit(self, filename=None):
+    def _live_chunks(self, chunk_size=4096):
         """
-        Writes the database to a file. 
-        If no filename is specified, the original file is overwritten.
-        Skips records marked as deleted, thus effectively deleting them, 
-        and adjusts the header accordingly.
+        Returns a generator of bytes objects with the raw contents of the records not marked as deleted,
+        reading 'chunk_size' records at a time and looking only at the deletion flag of each record.
+        Meant for internal use only.
         """
-        numdeleted = 0
-        for record in self[:]:
-            if record.get('deleted'):
-                numdeleted += 1
-        file = open('tmp.dbf', 'wb')
-        file.write(self.header.to_bytes())
-        for field in self.fields:
-            file.write(field.to_bytes())
-        file.write(b'\x0D')
-        for record in self[:]:
-            if record['deleted']:    
-                # self.file.write(b'*')
+        size = self.header.record_size
+        for start in range(0, self.header.records, chunk_size):
+            data = self._read_records(start, min(start + chunk_size, self.header.records))
+            flags = bytes(data[::size])
+            if b'*' not in flags:
+                yield data
                 continue
-            else:   
-                file.write(b' ')
-            for field in self.fields:
-                ftype = field.type
-                if ftype == 'C':
-                    file.write(record[field.name].ljust(field.length, ' ').encode('latin1'))
-                elif ftype == 'N' or ftype == 'F':
-                    file.write(str(record[field.name]).rjust(field.length, ' ').encode('latin1'))   
-                elif ftype == 'D':
-                    file.write(record[field.name].strftime('%Y%m%d').encode('latin1'))
-                elif ftype == 'L':
-                    file.write(b'T' if record[field.name] else b'F')
-                else:
-                    raise ValueError(f"Unknown field type {field.type}")
-        # file.write(b'\x1A')
-        self.header.records -= numdeleted
-        self.filesize -= numdeleted * self.header.record_size
-        self.datasize = self.header.record_size * self.header.records
-        file.seek(0)
-        file.write(self.header.to_bytes())
-        file.flush()
-        self.file.close()
-        if not filename:
-            filename = self.filename
-            os.remove(filename)
+            # Copy the runs of live records between deleted ones
+            parts = []
+            run = None
+            for i, flag in enumerate(flags):
+                if flag == 42: # '*'
+                    if run is not None:
+                        parts.append(data[run * size:i * size])
+                        run = None
+                elif run is None:
+                    run = i
+            if run is not None:
+                parts.append(data[run * size:len(flags) * size])
+            yield b''.join(parts)
+
+    def _reload(self, filename):
+        """
+        Reopens the database after it has been packed, rebuilding its structures,
+        the cache and the indexes.
+        Meant for internal use only.
+        """
         self.filename = filename
-        os.rename('tmp.dbf', self.filename)
         self.file = open(self.filename, 'r+b')
+        self._open_locks()
         self.num_fields = 0
         self.fields = []
         self.header = None
         self.datasize = 0
+        self.deletion_flags = None
         self. _init()
+        self._map()
+        if self.cache is not None:
+            self.cache.clear()
+            self.cache.record_size = self.header.record_size
+        self.reindex()
+
+    @_writer
+    def commit(self, filename=None, chunk_size=4096):
+        """
+        Writes the database to a file. 
+        If no filename is specified, the original file is overwritten.
+        Skips records marked as deleted, thus effectively deleting them, 
+        and adjusts the header accordingly.
+        Records are copied as raw bytes, 'chunk_size' at a time, to a temporary file in the
+        directory of the target file, which is then renamed over it, so memory use is constant 
+        and the target file is replaced atomically, keeping its permissions (a new file gets 
+        those of the database).
+        Within a batch, the records buffered so far are written first.
+        When writing to another file, the memo file (.dbt), if any, is copied along.
+        """
+        if self.batch_writer is not None:
+            self.batch_writer.flush()
+        if not filename:
+            filename = self.filename
+        header = DbaseHeader()
+        header.load_bytes(self.header.to_bytes())
+        header.records = 0
+        directory = os.path.dirname(os.path.abspath(filename))
+        memo_filename = self._memo_filename(filename)
+        memo_tmpname = None
+        fd, tmpname = tempfile.mkstemp(suffix='.dbf', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(header.to_bytes())
+                for field in self.fields:
+                    file.write(field.to_bytes())
+                file.write(b'\x0D')
+                for data in self._live_chunks(chunk_size):
+                    file.write(data)
+                    header.records += len(data) // header.record_size
+                # file.write(b'\x1A')
+                file.seek(0)
+                file.write(header.to_bytes())
+            # mkstemp creates the file readable by its owner only: a new file takes the permissions of this one
+            shutil.copymode(filename if os.path.exists(filename) else self.filename, tmpname)
+            if self.memo is not None and os.path.abspath(memo_filename) != os.path.abspath(self.memo.filename):
+                # Memos of the records left out stay behind, unreferenced, as after deleting a record
+                self.memo.file.flush()
+                fd, memo_tmpname = tempfile.mkstemp(suffix='.dbt', dir=directory)
+                os.close(fd)
+                shutil.copyfile(self.memo.filename, memo_tmpname)
+                shutil.copymode(memo_filename if os.path.exists(memo_filename) else self.memo.filename, 
+                                memo_tmpname)
+            self._unmap()
+            self.file.close()
+            if memo_tmpname is not None:
+                os.replace(memo_tmpname, memo_filename)
+                self.memo.close()
+                self.memo = None
+            os.replace(tmpname, filename)
+        except BaseException:
+            for name in (tmpname, memo_tmpname):
+                if name is not None and os.path.exists(name):
+                    os.remove(name)
+            raise
+        self._reload(filename)
+
+    @_writer
+    def pack(self, chunk_size=4096):
+        """
+        Removes the records marked as deleted in place, moving the remaining ones down
+        with a read cursor and a write cursor, 'chunk_size' records at a time, and truncating the file.
+        Needs no extra disk space, unlike commit(), but the file is left inconsistent if interrupted.
+        """
+        if self.batch_writer is not None:
+            self.batch_writer.flush()
+        size = self.header.record_size
+        position = self.header.header_size
+        records = 0
+        for data in self._live_chunks(chunk_size):
+            # The write cursor never gets ahead of the read cursor, so unread records are never overwritten
+            self._write_at(position, data)
+            position += len(data)
+            records += len(data) // size
+        self.file.flush()
+        self._unmap()
+        self.header.records = records
+        self.file.truncate(position)
+        self._write_header()
+        self.file.close()
+        self._reload(self.filename)
 
     # def add_field(self, name, type, length, decimal=0):
     #     if len(self.records) > 0:
@@ -451,6 +1803,17 @@ class DbaseFile:
         if 0 > key >= self.header.records:  
             raise IndexError("Record index out of range")
 
+    def _touch(self):
+        """
+        Sets the date of last update in the header to today.
+        Meant for internal use only.
+        """
+        hoy = datetime.now()
+        self.header.year = hoy.year - 1900
+        self.header.month = hoy.month
+        self.header.day = hoy.day
+
+    @_writer
     def add_record(self, *data):
         """
         Adds a new record to the database.
@@ -459,30 +1822,63 @@ class DbaseFile:
         """
         if len(data) != len(self.fields):
             raise ValueError("Wrong number of fields")
-        value = b''
-        for field, val in zip(self.fields, data):
-            ftype = field.type
-            if ftype == 'C':
-                value += str(val).encode('latin1').ljust(field.length, b' ')
-            elif ftype == 'N' or ftype == 'F':
-                value += str(val).encode('latin1').rjust(field.length, b' ')
-            elif ftype == 'D':
-                value += val.strftime('%Y%m%d').encode('latin1')
-            elif ftype == 'L':
-                value = b'T' if val else b'F'
-        self.file.seek(self.filesize)
-        self.file.write(b'\x20' + value)
+        value = self.encoder.encode(data)
+        if self.cache is not None:
+            self.cache.discard(self.header.records)
+        self._write_at(self.filesize, value)
         self.header.records += 1
+        if self.deletion_flags is not None:
+            self.deletion_flags.append(value[0])
         self.filesize = self.header.header_size + self.header.record_size * self.header.records
-        hoy = datetime.now()
-        self.header.year = hoy.year - 1900
-        self.header.month = hoy.month
-        self.header.day = hoy.day
+        self._touch()
         self.datasize = self.header.record_size * self.header.records
-        self.file.seek(0)
-        self.file.write(self.header.to_bytes())        
-        self.file.flush()
+        self._write_header()
+        if self.indexes or self.hash_indexes:
+            key = self.header.records - 1
+            self._update_indexes(key, None, self.get_record(key))
+
+    def bulk_append(self, chunk_size=4096):
+        """
+        Returns a BulkAppender, to be used as a context manager, which adds records 
+        in blocks of chunk_size records and rewrites the header only once, when closed:
+
+            with dbf.bulk_append() as appender:
+                for row in rows:
+                    appender.add_record(*row)
+
+        :param chunk_size: Number of records buffered before each write.
+        """
+        return BulkAppender(self, chunk_size)
+
+    def add_records(self, rows, chunk_size=4096):
+        """
+        Adds many records to the database, writing them in blocks and updating the header once.
+        Rows are consumed one at a time, so a generator can be passed with bounded memory use.
+
+        :param rows: Iterable of rows, each one a sequence of values in field order 
+                     or a dictionary with field names and field values.
+        :param chunk_size: Number of records buffered before each write.
+        :return: Number of records added.
+        """
+        with self.bulk_append(chunk_size) as appender:
+            appender.add_records(rows)
+        return appender.added
+
+    def batch(self, fsync=False):
+        """
+        Returns a Batch, to be used as a context manager, which buffers the updates made by 
+        save_record, update_record and del_record, and writes them at once when the block ends
+        (or discards them if it raises):
 
+            with dbf.batch():
+                for i in range(len(dbf)):
+                    dbf.del_record(i)
+
+        :param fsync: If True, the file is synced to disk once the batch is written.
+        """
+        return Batch(self, fsync)
+
+    @_writer
     def del_record(self, key, value = True):
         """
         Marks a record as deleted.
@@ -492,8 +1888,8 @@ class DbaseFile:
         record = self.get_record(key)
         record['deleted'] = value
         self.save_record(key, record)
-        self.file.flush()
 
+    @_writer
     def update_record(self, key, record):
         """
         Updates an existing record in the database.
@@ -507,60 +1903,236 @@ class DbaseFile:
             self.commit()
         else:
             self.save_record(key, record)
-            self.file.flush()
 
-    def get_record(self, key):
+    def _projection(self, fields):
+        """
+        Returns the decoder for the given field names (case insensitive), or the decoder
+        of the whole record if 'fields' is None.
+        Meant for internal use only.
+
+        :raises ValueError: If a field doesn't exist.
+        """
+        if fields is None:
+            return self.decoder
+        if isinstance(fields, str):
+            fields = [fields]
+        names = []
+        for name in fields:
+            field = self.get_field(name)
+            if field is None:
+                raise ValueError(f"Field {name} not found")
+            names.append(field.name.strip())
+        return self.decoder.project(names)
+
+    def get_record(self, key, fields=None):
         """
         Retrieves a record (dictionary with field names and field values) from the database.
         Used internally by the __getitem__ method.
+
+        :param key: Index of the record.
+        :param fields: Names of the fields to read, or None for all of them.
         """
         self._test_key(key)
+        decoder = self._projection(fields)
+        if self.batch_writer is not None and key in self.batch_writer.records:
+            offset = self.header.header_size + key * self.header.record_size
+            return decoder(self.batch_writer.records[key], offset)
+        if self.cache is not None:
+            record = self.cache.get(key)
+            if record is not None:
+                if decoder is not self.decoder:
+                    # Field names are keys, not keyword arguments, which could clash with Dict's own
+                    return Record({'deleted': record['deleted'], 'offset': record['offset'],
+                                   **{name: record[name] for name in decoder.names}})
+                return Record(record)
         offset = self.header.header_size + key * self.header.record_size
-        self.file.seek(offset)
-        rec_bytes = self.file.read(self.header.record_size)
+        rec_bytes = self._read_at(offset, self.header.record_size)
         if len(rec_bytes) != self.header.record_size:
             err_msg = f"Error reading record {key}: expected {self.header.record_size} bytes, got {len(rec_bytes)}"
             os.sys.stderr.write(f"{err_msg}\n")
             os.sys.stderr.flush()
             return None
-        to_be_deleted = rec_bytes[0] == 0x2A
-        rec_bytes = rec_bytes[1:]
-        record = Record({'deleted': to_be_deleted, 'offset': offset})
-        for field in self.fields:
-            fieldtype = field.type
-            fieldname = field.name.strip("\0x00").strip()
-            fieldcontent = rec_bytes[:field.length].decode('latin1').strip("\x00") .strip()
-            fieldcontent = fieldcontent.replace('\x00', ' ')
-            if fieldtype == 'C':
-                record[fieldname] = fieldcontent
-            elif fieldtype == 'N':
-                if fieldcontent == '':
-                    fieldcontent = 0
-                try: 
-                    record[fieldname] = int(fieldcontent)
-                except ValueError:
-                    try:
-                        record[fieldname] = float(fieldcontent)
-                    except:
-                        record[fieldname] = fieldcontent
-            elif fieldtype == 'F':
-                if fieldcontent == '':
-                    fieldcontent = 0
-                try:
-                    record[fieldname] = float(fieldcontent)
-                except:
-                    record[fieldname] = fieldcontent
-            elif fieldtype == 'D':
-                try:
-                    record[fieldname] = datetime.strptime(fieldcontent, '%Y%m%d')
-                except:
-                    record[fieldname] = fieldcontent
-            elif fieldtype == 'L':
-                record[fieldname] = fieldcontent in ['T', 't', 'Y', 'y']
-            else:
-                raise ValueError(f"Unknown field type {fieldtype}")
-            rec_bytes = rec_bytes[field.length:]
-        return record
+        if decoder is not self.decoder:
+            return decoder(rec_bytes, offset)
+        if self.cache is None:
+            return self.decoder(rec_bytes, offset)
+        # Cached records are decoded at once, so that each one is decoded only once; callers get copies
+        record = self.decoder.decode(rec_bytes, offset)
+        self.cache.put(key, record)
+        return Record(record)
+
+    def _read_records(self, start, stop):
+        """
+        Reads the raw bytes of the records in the range [start, stop) with a single I/O call 
+        (or a single slice of the memory mapped view). Returns a bytes object.
+        Meant for internal use only.
+        """
+        size = self.header.record_size
+        offset = self.header.header_size + start * size
+        length = (stop - start) * size
+        data = self._read_at(offset, length)
+        if self.batch_writer is not None and self.batch_writer.records:
+            data = self.batch_writer.patch(start, stop, data)
+        return data
+
+    def iter_records(self, start=0, stop=None, chunk_size=1024, fields=None):
+        """
+        Returns a generator over the records in the range [start, stop).
+        Records are read chunk_size at a time, with a single read per chunk, 
+        and each chunk is decoded as a batch.
+
+        :param start: Index of the first record.
+        :param stop: Index past the last record. Defaults to the number of records.
+        :param chunk_size: Number of records read at once.
+        :param fields: Names of the fields to read, or None for all of them.
+        """
+        if start is None or start < 0:
+            start = 0
+        if stop is None or stop > self.header.records:
+            stop = self.header.records
+        decoder = self._projection(fields)
+        for chunk_start in range(start, stop, chunk_size):
+            chunk_stop = min(chunk_start + chunk_size, stop)
+            buffer = self._read_records(chunk_start, chunk_stop)
+            offset = self.header.header_size + chunk_start * self.header.record_size
+            yield from decoder.decode_many(buffer, offset)
+    
+    def _deletion_flags(self, chunk_size=65536):
+        """
+        Returns the deletion map: a bytearray with the deletion flag of each record ('*' for
+        deleted records, ' ' for live ones), built on first use by reading only the first byte 
+        of each record (out of the memory mapped view, or out of buffers of chunk_size records),
+        and kept up to date afterwards.
+        Meant for internal use only.
+        """
+        with self.lock:
+            if self.deletion_flags is not None:
+                return self.deletion_flags
+            size = self.header.record_size
+            flags = bytearray()
+            for start in range(0, self.header.records, chunk_size):
+                stop = min(start + chunk_size, self.header.records)
+                data = self._read_records(start, stop)
+                flags += data[::size].tobytes() if isinstance(data, memoryview) else data[::size]
+            self.deletion_flags = flags
+            return flags
+
+    def live_count(self):
+        """
+        Returns the number of records not marked as deleted.
+        """
+        return self.header.records - self._deletion_flags().count(b'*')
+
+    def iter_live(self, start=0, stop=None, chunk_size=1024, fields=None):
+        """
+        Returns a generator over the records not marked as deleted in the range [start, stop),
+        as iter_records does. Deleted records are skipped by their flag in the deletion map, 
+        without decoding them; chunks holding only deleted records are not even read.
+
+        :param start: Index of the first record.
+        :param stop: Index past the last record. Defaults to the number of records.
+        :param chunk_size: Number of records read at once.
+        :param fields: Names of the fields to read, or None for all of them.
+        """
+        if start is None or start < 0:
+            start = 0
+        if stop is None or stop > self.header.records:
+            stop = self.header.records
+        decoder = self._projection(fields)
+        flags = self._deletion_flags()
+        size = self.header.record_size
+        for chunk_start in range(start, stop, chunk_size):
+            chunk_stop = min(chunk_start + chunk_size, stop)
+            chunk_flags = flags[chunk_start:chunk_stop]
+            deleted = chunk_flags.count(b'*')
+            if deleted == len(chunk_flags):
+                continue
+            buffer = self._read_records(chunk_start, chunk_stop)
+            offset = self.header.header_size + chunk_start * size
+            if not deleted:
+                yield from decoder.decode_many(buffer, offset)
+                continue
+            with memoryview(buffer) as view:
+                for row, flag in enumerate(chunk_flags):
+                    if flag != 42: # '*'
+                        yield decoder(view[row * size:(row + 1) * size], offset + row * size)
+
+    def to_columns(self, start=0, stop=None, chunk_size=65536, fields=None):
+        """
+        Decodes the records in the range [start, stop) into columns, without building a record for each row.
+        Values are the same found in the records returned by get_record.
+
+        :param start: Index of the first record.
+        :param stop: Index past the last record. Defaults to the number of records.
+        :param chunk_size: Number of records read at once.
+        :param fields: Names of the fields to decode, or None for all of them.
+        :return: Dictionary with a list of values for each field name, plus the 'deleted' flags.
+        """
+        if start is None or start < 0:
+            start = 0
+        if stop is None or stop > self.header.records:
+            stop = self.header.records
+        decoder = self._projection(fields)
+        names = decoder.names
+        ret = {'deleted': []}
+        ret.update((name, []) for name in names)
+        for chunk_start in range(start, stop, chunk_size):
+            buffer = self._read_records(chunk_start, min(chunk_start + chunk_size, stop))
+            deleted, columns = decoder.decode_columns(buffer)
+            ret['deleted'].extend(deleted)
+            for name, column in zip(names, columns):
+                ret[name].extend(column)
+        return ret
+
+    def to_numpy(self, start=0, stop=None, chunk_size=65536):
+        """
+        Decodes the records in the range [start, stop) into NumPy arrays, one per field,
+        parsing each field as a fixed width column of the raw records (see the columnar module).
+        Requires NumPy.
+
+        Numeric fields become int64 (no decimals) or float64 arrays, with NaN for unparsable values; 
+        dates become datetime64[D] arrays, with NaT for blank or invalid dates; logicals become bool arrays;
+        characters become str arrays; memos become int64 arrays of memo block numbers.
+
+        :param start: Index of the first record.
+        :param stop: Index past the last record. Defaults to the number of records.
+        :param chunk_size: Number of records read at once.
+        :return: Dictionary with an array for each field name, plus the 'deleted' flags.
+        :raises ImportError: If NumPy is not installed.
+        """
+        columnar.require_numpy()
+        np = columnar.np
+        if start is None or start < 0:
+            start = 0
+        if stop is None or stop > self.header.records:
+            stop = self.header.records
+        names = self.decoder.names
+        chunks = {'deleted': []}
+        chunks.update((name, []) for name in names)
+        buffers = (self._read_records(chunk_start, min(chunk_start + chunk_size, stop)) 
+                   for chunk_start in range(start, stop, chunk_size))
+        for buffer in chain(buffers, [b''] if stop <= start else []):
+            records = columnar.records_array(buffer, self.header.record_size)
+            chunks['deleted'].append(records[:, 0] == ord('*'))
+            for name, field, (begin, end) in zip(names, self.fields, self.decoder.offsets):
+                chunks[name].append(columnar.parse_column(records[:, begin:end], field.type, field.decimal))
+        return {name: np.concatenate(arrays) for name, arrays in chunks.items()}
+
+    def set_cache(self, max_entries=1024, max_bytes=None):
+        """
+        Enables a bounded LRU cache in front of get_record, replacing the current one if any.
+        Records read through get_record (indexing, line, lines) are cached; sequential scans are not.
+        The cache is kept coherent by save_record, add_record, del_record and commit.
+
+        :param max_entries: Maximum number of records held. Use 0 to disable the cache.
+        :param max_bytes: Maximum amount of record data held, if not None.
+        :return: RecordCache object, which keeps hit and miss counters, or None if disabled.
+        """
+        if not max_entries:
+            self.cache = None
+        else:
+            self.cache = RecordCache(max_entries, max_bytes, self.header.record_size)
+        return self.cache
     
     def get_field(self, fieldname):
         """
@@ -571,18 +2143,16 @@ class DbaseFile:
                 return field
         return None
 
-    def search(self, fieldname, value, start=0, funcname="", comp_func=None):
+    def _resolve_search(self, fieldname, comp_func=None):
         """
-        Searches for a record with the specified value in the specified field,
-        starting from the specified index, for which the specified comparison function returns True.
+        Returns the actual name of the field to search in and the comparison function to use,
+        defaulting to the one suited to the field type.
+        Meant for internal use only.
         """
-        if funcname not in ("find", "index", ""):
-            raise ValueError("Invalid function name") 
         field = self.get_field(fieldname)
         if not field:
             raise ValueError(f"Field {fieldname} not found")
-        elif fieldname != field.name.strip():
-            fieldname = field.name.strip()
+        fieldname = field.name.strip()
         fieldtype = field.type
         if not comp_func:
             if fieldtype == FieldType.CHARACTER.value:
@@ -594,21 +2164,70 @@ class DbaseFile:
                 comp_func = lambda f, v: f == v
             else:
                 raise ValueError(f"Invalid field type {fieldtype} for comparison")
-            
-        for i, record in enumerate(self[start:]):
+        return fieldname, comp_func
+
+    def _where_operator(self, fieldname, value, comp_func):
+        """
+        Returns the operator for where() equivalent to searching for 'value' in 'fieldname' 
+        with 'comp_func', or None if there is none.
+        Meant for internal use only.
+        """
+        field = self.get_field(fieldname)
+        if not field:
+            return None
+        if field.type == FieldType.CHARACTER.value:
+            if comp_func in (None, self.istartswith) and isinstance(value, str):
+                return 'istartswith'
+        elif comp_func is None:
+            if field.type in (FieldType.NUMERIC.value, FieldType.FLOAT.value):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    return '=='
+            elif field.type == FieldType.DATE.value and isinstance(value, datetime):
+                return '=='
+        return None
+
+    def finditer(self, fieldname, value, start=0, comp_func=None):
+        """
+        Returns a generator of (index, record) tuples for the records, from the specified index onwards,
+        for which the comparison function returns True. 
+        Each record is read and decoded only once, and no record past the last one consumed is decoded.
+        Equality searches on numeric and date fields, and istartswith searches on character fields,
+        only visit the records pointed by an in memory index (see build_index) or an open index file
+        on the field, if there is one, or else are evaluated on the raw field by where().
+        """
+        candidates = self._index_candidates(fieldname, value, comp_func)
+        op = self._where_operator(fieldname, value, comp_func)
+        fieldname, comp_func = self._resolve_search(fieldname, comp_func)
+        if start is None or start < 0:
+            start = 0
+        if candidates is not None:
+            for i in candidates:
+                if i >= start:
+                    record = self.get_record(i)
+                    if comp_func(record[fieldname], value):
+                        yield i, record
+            return
+        if op is not None:
+            yield from self.where(fieldname, op, value, start)
+            return
+        for i, record in enumerate(self.iter_records(start), start):
             if comp_func(record[fieldname], value):
-                if funcname == "":
-                    return i + start, record
-                elif funcname == "find":
-                    return record
-                elif funcname == "index":
-                    return i + start
+                yield i, record
+
+    def search(self, fieldname, value, start=0, funcname="", comp_func=None):
+        """
+        Searches for a record with the specified value in the specified field,
+        starting from the specified index, for which the specified comparison function returns True.
+        """
+        if funcname not in ("find", "index", ""):
+            raise ValueError("Invalid function name") 
+        i, record = next(self.finditer(fieldname, value, start, comp_func), (-1, None))
         if funcname == "":
-            return -1, None
+            return i, record
         elif funcname == "find":
-            return None
+            return record
         elif funcname == "index":
-            return -1
+            return i
 
     def find(self, fieldname, value, start=0, comp_func=None): 
         """
@@ -624,36 +2243,324 @@ class DbaseFile:
         """ 
         return self.search(fieldname, value, start, "index", comp_func)
 
+    _operators = {
+        '==': operator.eq,
+        '!=': operator.ne,
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+        'between': lambda f, v: v[0] <= f <= v[1],
+        'startswith': lambda f, v: f.startswith(v),
+        'istartswith': lambda f, v: f.lower().startswith(v.lower()),
+    }
+
+    def where(self, fieldname, op, value, start=0, stop=None, chunk_size=65536):
+        """
+        Returns a generator of (index, record) tuples for the records in the range [start, stop)
+        whose value in the specified field satisfies a simple predicate.
+        Records are read in chunks and, when NumPy is available, the predicate is first evaluated 
+        on the raw bytes of the field across the whole chunk (see columnar.match_column), 
+        so that only candidate records are decoded. Otherwise only the field is decoded for each record.
+        Values that cannot be compared with 'value' (i.e. a number and a string) don't match.
+
+        :param fieldname: Name of the field.
+        :param op: One of '==', '!=', '<', '<=', '>', '>=', 'between', 'startswith' or 'istartswith'.
+        :param value: Value to compare with, or (low, high) tuple for 'between'.
+        :param start: Index of the first record.
+        :param stop: Index past the last record. Defaults to the number of records.
+        :param chunk_size: Number of records read at once.
+        """
+        if op not in self._operators:
+            raise ValueError(f"Invalid operator {op}")
+        field = self.get_field(fieldname)
+        if not field:
+            raise ValueError(f"Field {fieldname} not found")
+        position = self.fields.index(field)
+        name = self.decoder.names[position]
+        begin, end = self.decoder.offsets[position]
+        convert = self.decoder.converters[position]
+        compare = self._operators[op]
+
+        def test(fieldvalue):
+            try:
+                return bool(compare(fieldvalue, value))
+            except (TypeError, AttributeError):
+                return False
+
+        if start is None or start < 0:
+            start = 0
+        if stop is None or stop > self.header.records:
+            stop = self.header.records
+        size = self.header.record_size
+        for chunk_start in range(start, stop, chunk_size):
+            buffer = self._read_records(chunk_start, min(chunk_start + chunk_size, stop))
+            mask = None
+            if columnar.np is not None:
+                records = columnar.records_array(buffer, size)
+                mask = columnar.match_column(records[:, begin:end], field.type, field.decimal, op, value)
+            if mask is not None:
+                rows = columnar.np.flatnonzero(mask).tolist()
+            else:
+                text = str(buffer, 'latin1')
+                rows = [row for row in range(len(buffer) // size) 
+                        if test(convert(text[row * size + begin:row * size + end]
+                                        .strip("\x00").strip().replace('\x00', ' ')))]
+            offset = self.header.header_size + chunk_start * size
+            for row in rows:
+                record = self.decoder(buffer[row * size:(row + 1) * size], offset + row * size)
+                if test(record[name]):
+                    yield chunk_start + row, record
+
+    def _parallel(self, task, start, stop, workers):
+        """
+        Splits the range [start, stop) in chunks, runs a task on each of them in a pool of processes 
+        and returns the concatenated results, in record order.
+        Meant for internal use only.
+        """
+        if start is None or start < 0:
+            start = 0
+        if stop is None or stop > self.header.records:
+            stop = self.header.records
+        if stop <= start:
+            return []
+        workers = workers or os.cpu_count() or 1
+        # A few chunks per worker, so that uneven chunks don't leave workers idle
+        size = max(-(-(stop - start) // (workers * 4)), 1)
+        bounds = [(i, min(i + size, stop)) for i in range(start, stop, size)]
+        self.file.flush()
+        ret = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_parallel_task, self.filename, a, b, task) for a, b in bounds]
+            for future in futures:
+                ret.extend(future.result())
+        return ret
+
+    def parallel_map(self, func, start=0, stop=None, workers=None):
+        """
+        Applies a function to each record in the range [start, stop), in a pool of processes, 
+        each one reading its own share of the records. Returns the list of results, in record order.
+
+        :param func: Function taking a record. Must be picklable, i.e. defined at module level.
+        :param start: Index of the first record.
+        :param stop: Index past the last record. Defaults to the number of records.
+        :param workers: Number of processes. Defaults to the number of CPUs.
+        """
+        return self._parallel(('map', func), start, stop, workers)
+
+    def parallel_filter(self, fieldname, value, comp_func=None, workers=None):
+        """
+        Same as filter(), with the records split among a pool of processes.
+        Returns a list of records (dictionaries) that meet the specified criteria, in record order.
+
+        :param comp_func: Comparison function. If given, it must be picklable, i.e. defined at module level 
+                          (as DbaseFile.istartswith). Defaults to the same comparison filter() uses, 
+                          evaluated by where().
+        :param workers: Number of processes. Defaults to the number of CPUs.
+        """
+        field = self.get_field(fieldname)
+        if not field:
+            raise ValueError(f"Field {fieldname} not found")
+        if comp_func is None:
+            if field.type == FieldType.CHARACTER.value:
+                task = ('where', fieldname, 'istartswith', value)
+            elif field.type in (FieldType.NUMERIC.value, FieldType.FLOAT.value, FieldType.DATE.value):
+                task = ('where', fieldname, '==', value)
+            else:
+                raise ValueError(f"Invalid field type {field.type} for comparison")
+        else:
+            task = ('filter', fieldname, value, comp_func)
+        return self._parallel(task, 0, None, workers)
+
     def filter(self, fieldname, value, comp_func=None):
         """
         Returns a list of records (dictionaries) that meet the specified criteria.
+        The database is scanned once.
         """
-        ret = []
-        index = -1
-        while True:
-            index, record = self.search(fieldname, value, index + 1, "", comp_func)  
-            if index < 0:
-                return ret
-            else:    
-                ret.append(record)
+        return [record for _, record in self.finditer(fieldname, value, 0, comp_func)]
+
+    def _index_name(self, fieldnames):
+        """
+        Returns the default name for the index file on the given fields, next to the database file.
+        Meant for internal use only.
+        """
+        return os.path.splitext(self.filename)[0] + '_' + '_'.join(fieldnames).lower() + '.ndx'
+
+    def create_index(self, fieldnames, filename=None, upper=True):
+        """
+        Creates an index file (.ndx) on one or more fields, and opens it.
+        Once open, the index is used by search, find, index and filter, and is kept up to date
+        by add_record, save_record and commit.
+
+        :param fieldnames: Name of the field, or list of names of the (character) fields, to index on.
+        :param filename: Name of the index file. Defaults to the database name followed by the field names.
+        :param upper: If True, character keys are folded to upper case (i.e. 'UPPER(NAME)'),
+                      which is what allows case insensitive searches to use the index.
+        :return: NdxIndex object.
+        """
+        if isinstance(fieldnames, str):
+            fieldnames = [fieldnames]
+        names = []
+        for fieldname in fieldnames:
+            field = self.get_field(fieldname)
+            if not field:
+                raise ValueError(f"Field {fieldname} not found")
+            names.append(field.name.strip().upper())
+        expression = '+'.join(names)
+        if upper and all(self.get_field(name).type == FieldType.CHARACTER.value for name in names):
+            expression = f"UPPER({expression})"
+        key = IndexKey(expression, self.fields)
+        filename = filename or self._index_name(names)
+        entries = ((key.key_of(record), i + 1) for i, record in enumerate(self.iter_records()))
+        index = NdxIndex.create(filename, expression, key.key_length, key.numeric, entries)
+        self.indexes[filename] = (index, key)
+        return index
+
+    def open_index(self, filename):
+        """
+        Opens an existing index file (.ndx) for this database.
+
+        :param filename: Name of the index file.
+        :return: NdxIndex object.
+        :raises ValueError: If the key expression of the index is not supported, or doesn't match the database.
+        """
+        index = NdxIndex(filename)
+        key = IndexKey(index.expression, self.fields)
+        if key.numeric != index.numeric or (not key.numeric and key.key_length != index.header.key_length):
+            index.close()
+            raise ValueError(f"Index {filename} doesn't match the fields of {self.filename}")
+        self.indexes[filename] = (index, key)
+        return index
+
+    def close_index(self, filename):
+        """
+        Closes an open index file. The index is no longer used nor updated.
+        """
+        index, _ = self.indexes.pop(filename)
+        index.close()
+
+    def reindex(self):
+        """
+        Rebuilds all the open index files from the records in the database.
+        """
+        for index, key in self.indexes.values():
+            index.rebuild((key.key_of(record), i + 1) for i, record in enumerate(self.iter_records()))
+        for fieldname in list(self.hash_indexes):
+            self.build_index(fieldname)
+
+    def build_index(self, fieldname):
+        """
+        Builds an in memory index on a field, mapping each value to the records holding it.
+        While it exists, search, find, index and filter use it for lookups with the default
+        comparison function (exact match on numeric and date fields, istartswith on character fields),
+        and add_record, save_record (thus update_record and del_record) and commit keep it up to date.
+
+        :param fieldname: Name of the field to index on.
+        :return: HashIndex object.
+        """
+        field = self.get_field(fieldname)
+        if not field:
+            raise ValueError(f"Field {fieldname} not found")
+        fieldname = field.name.strip()
+        index = HashIndex(fieldname, field.type)
+        for i, record in enumerate(self.iter_records()):
+            index.add(record[fieldname], i)
+        self.hash_indexes[fieldname] = index
+        return index
+
+    def drop_index(self, fieldname):
+        """
+        Discards the in memory index on a field.
+        """
+        field = self.get_field(fieldname)
+        if field:
+            self.hash_indexes.pop(field.name.strip(), None)
+
+    def _index_candidates(self, fieldname, value, comp_func):
+        """
+        Returns the sorted list of indexes of the records an open index points to, 
+        when searching for 'value' in 'fieldname' with 'comp_func', 
+        or None if no open index can serve the search.
+        Indexes are updated when a batch is flushed, so they don't serve searches 
+        while a batch holds buffered writes.
+        Meant for internal use only.
+        """
+        if self.batch_writer is not None and self.batch_writer.records:
+            return None
+        field = self.get_field(fieldname)
+        if not field or not (self.indexes or self.hash_indexes):
+            return None
+        if field.type == FieldType.CHARACTER.value:
+            if comp_func not in (None, self.istartswith):
+                return None
+        elif comp_func is not None:
+            return None
+        hash_index = self.hash_indexes.get(field.name.strip())
+        if hash_index is not None:
+            if not hash_index.char:
+                return hash_index.lookup(value)
+            elif isinstance(value, str):
+                return hash_index.startswith(value)
+        for index, key in self.indexes.values():
+            if key.names[0] != field.name.strip():
+                continue
+            query = key.query(value)
+            if query is None:
+                continue
+            recnos = index.find(query) if key.numeric else index.startswith(query)
+            return sorted(recno - 1 for recno in recnos)
+        return None
+
+    def _update_indexes(self, key, old_record, new_record):
+        """
+        Updates the open indexes after the record at the given index changed from 
+        old_record (None for new records) to new_record.
+        Meant for internal use only.
+        """
+        for fieldname, hash_index in self.hash_indexes.items():
+            if old_record is not None:
+                if old_record[fieldname] == new_record[fieldname]:
+                    continue
+                hash_index.remove(old_record[fieldname], key)
+            hash_index.add(new_record[fieldname], key)
+        for index, index_key in self.indexes.values():
+            new_key = index_key.key_of(new_record)
+            if old_record is not None:
+                old_key = index_key.key_of(old_record)
+                if old_key == new_key:
+                    continue
+                index.remove(old_key, key + 1)
+            index.insert(new_key, key + 1)
+
+    def _fields_of(self, fields):
+        """
+        Returns the field objects for the given field names, or all of them if 'fields' is None.
+        Meant for internal use only.
+        """
+        if fields is None:
+            return self.fields
+        names = self._projection(fields).names
+        return [field for name in names for field in self.fields if field.name.strip() == name]
 
-    def list(self, start=0, stop=None, fieldsep="|", records:list=None):
+    def list(self, start=0, stop=None, fieldsep="|", records:list=None, fields=None):
         """
         Returns a generator, corresponding to the list of records from the database.
+        If 'fields' (a list of field names) is given, only those fields are read and listed.
         """
         if start is None:
             start = 0
         if stop is None:
             stop = self.header.records
-        l = records or [self.get_record(i) for i in range(start, stop)]
+        l = records or self.iter_records(start, stop, fields=fields)
+        names = [field.name for field in self._fields_of(fields)]
         # return recordsep.join(fieldsep.join(str(record[field.name]) for field in self.fields) for record in l)
-        return (fieldsep.join(str(record[field.name]) for field in self.fields) for record in l)
+        return (fieldsep.join(str(record[name]) for name in names) for record in l)
     
-    def csv(self, start=0, stop=None, records:list = None):
+    def csv(self, start=0, stop=None, records:list = None, fields=None):
         """
         Returns a generator of CSV strings, each one with the CSV repr o a record in the database.
         """
-        return self.list(start, stop, ",", records)
+        return self.list(start, stop, ",", records, fields)
     
     @property
     def csv_headers_line(self):
@@ -662,9 +2569,10 @@ class DbaseFile:
         """
         return ",".join(self.field_names)
     
-    def table(self, start=0, stop=None, records:list = None):
+    def table(self, start=0, stop=None, records:list = None, fields=None):
         """
         Returns a table string with the records in the database.
+        If 'fields' (a list of field names) is given, only those fields are read and shown.
         """
         def _format_field(field, record):
             if field.type == FieldType.CHARACTER.value:
@@ -676,11 +2584,12 @@ class DbaseFile:
             start = 0
         if stop is None:
             stop = self.header.records
-        l = records or [self.get_record(i) for i in range(start, stop)]
+        l = records or self.iter_records(start, stop, fields=fields)
+        selected = self._fields_of(fields)
         line_bracket = "+"
-        line_divider = line_bracket + line_bracket.join("-" * (field.length + 2) for field in self.fields) + line_bracket + "\n"
-        header_line = "|" + "|".join(field.name.center(field.length + 2) for field in self.fields) + "|" + "\n"
-        record_lines =  ('\n' + line_divider).join("|" + "|".join(_format_field(field, record) for field in self.fields) + "|" for record in l)
+        line_divider = line_bracket + line_bracket.join("-" * (field.length + 2) for field in selected) + line_bracket + "\n"
+        header_line = "|" + "|".join(field.name.center(field.length + 2) for field in selected) + "|" + "\n"
+        record_lines =  ('\n' + line_divider).join("|" + "|".join(_format_field(field, record) for field in selected) + "|" for record in l)
         return line_divider + header_line + line_divider + record_lines + "\n" + line_divider
 
     def line(self, index, fieldsep="", names_lengths:list=None):
@@ -690,13 +2599,22 @@ class DbaseFile:
         record = self.get_record(index)
         names_lengths = names_lengths or zip(self.field_names, self.max_field_lengths)
         # names_lengths = names_lengths or zip(self.field_names, self.field_lengths)
+        return self._line_of(record, fieldsep, names_lengths)
+
+    @staticmethod
+    def _line_of(record, fieldsep, names_lengths):
+        """
+        Returns the text line of a record, as line() does.
+        Meant for internal use only.
+        """
         afields = [f"{str(record.get(name)).rjust(length).ljust(length+1)}" for name, length in names_lengths]
         return fieldsep.join(afields)
     
-    def lines(self, start=0, stop=None, fieldsep=""):
+    def lines(self, start=0, stop=None, fieldsep="", chunk_size=1024):
         """
         Returns a generator which resolves to an array of strings, each one with 
         with the records in the specified range, with fields right aligned to max field lengths.
+        Records are read chunk_size at a time.
         """
         if start is None:
             start = 0
@@ -706,7 +2624,8 @@ class DbaseFile:
         # names_lengths = list(zip(self.field_names, self.field_lengths))
         # return recordsep.join([self.line(i, fieldsep, names_lengths=names_lengths)
         #                         for i in range(start, stop)])
-        return (self.line(i, fieldsep, names_lengths=names_lengths) for i in range(start, stop)) 
+        return (self._line_of(record, fieldsep, names_lengths) 
+                for record in self.iter_records(start, stop, chunk_size))
        
     def headers_line(self, fieldsep=""):
         """
@@ -717,30 +2636,50 @@ class DbaseFile:
         afields = [f"{name.rjust(length).ljust(length+1)}" for name, length in names_lengths]
         return fieldsep.join(afields)
     
+    def _store_memos(self, record, old_record):
+        """
+        Writes the memo fields of 'record' holding new text to the memo file, reusing the blocks 
+        of the memos in 'old_record' (the record being replaced) when the text fits in them.
+        Within a batch, blocks are not reused, so that the old memos survive a rollback.
+        Returns a copy of the record with Memo handles in place of the new text.
+        Meant for internal use only.
+        """
+        record = Record(record)
+        for field in self.fields:
+            if field.type != FieldType.MEMO.value:
+                continue
+            name = field.name.strip()
+            value = record.get(name)
+            if value is None or isinstance(value, Memo) and (value.dbt is self.memo or not value.block):
+                continue
+            old = old_record.get(name)
+            block = old.block if isinstance(old, Memo) and self.batch_writer is None else 0
+            text = str(value)
+            record[name] = Memo(self.memo, self.memo.write(text, block), text)
+        return record
+
+    @_writer
     def save_record(self, key, record):
         """
         Writes a record (dictionary with field names and field values) to the database
         at the specified index.
         """
         self._test_key(key)
-        self.file.seek(self.header.header_size + key * self.header.record_size)
-        if record.get('deleted'):
-            self.file.write(b'*')
-        else:
-            self.file.write(b' ')
-        for field in self.fields:
-            ftype = field.type
-            if ftype == 'C':
-                self.file.write(record[field.name].ljust(field.length, ' ').encode('latin1'))
-            elif ftype == 'N' or ftype == 'F':
-                self.file.write(str(record[field.name]).rjust(field.length, ' ').encode('latin1'))
-            elif ftype == 'D':
-                self.file.write(record[field.name].strftime('%Y%m%d').encode('latin1'))
-            elif ftype == 'L':
-                self.file.write(b'\x01' if record[field.name] else b'\x00')
-            else:
-                raise ValueError(f"Unknown field type {field.type}")
+        old_record = self.get_record(key) if self.indexes or self.hash_indexes or self.memo else None
+        if self.memo is not None:
+            record = self._store_memos(record, old_record)
+        if self.cache is not None:
+            self.cache.discard(key)
+        data = self.encoder.encode_record(record)
+        if self.deletion_flags is not None:
+            self.deletion_flags[key] = data[0]
+        if self.batch_writer is not None:
+            self.batch_writer.put(key, data, old_record)
+            return
+        self._write_at(self.header.header_size + key * self.header.record_size, data)
         self.file.flush()
+        if self.indexes or self.hash_indexes:
+            self._update_indexes(key, old_record, self.get_record(key))
 
     def exec(self, sql_cmd: str):
         """
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+#-*- coding: utf_8 -*-
+# dbfexport.py - Streams the records of a DBF file as CSV, JSON Lines or TSV
+
+import os, sys, csv, json, time, argparse
+from datetime import datetime
+
+try:
+    from dbase3_py.dbase3 import DbaseFile, FieldType
+except ImportError:
+    from dbase3 import DbaseFile, FieldType
+
+FORMATS = ('csv', 'jsonl', 'tsv')
+
+
+def _text_formatter(field):
+    """
+    Returns a function turning the values of a field into text for CSV and TSV exports.
+    Dates become YYYY-MM-DD, logicals T or F.
+    """
+    if field.type == FieldType.DATE.value:
+        return lambda value: value.strftime('%Y-%m-%d') if isinstance(value, datetime) else value
+    if field.type == FieldType.LOGICAL.value:
+        return lambda value: 'T' if value else 'F'
+    if field.type == FieldType.MEMO.value:
+        return str
+    return None
+
+def _json_formatter(field):
+    """
+    Returns a function turning the values of a field into JSON values.
+    Dates become YYYY-MM-DD strings (null if blank), memos strings;
+    numbers which could not be parsed are kept as strings.
+    """
+    if field.type == FieldType.DATE.value:
+        return lambda value: value.strftime('%Y-%m-%d') if isinstance(value, datetime) else (value or None)
+    if field.type == FieldType.MEMO.value:
+        return str
+    return None
+
+
+def _select_fields(dbf, fields):
+    """
+    Returns the field objects for the given field names (case insensitive), or all of them.
+
+    :raises ValueError: If a field doesn't exist.
+    """
+    if fields is None:
+        return dbf.fields
+    selected = []
+    for name in fields:
+        field = dbf.get_field(name)
+        if field is None:
+            raise ValueError(f"Field {name} not found")
+        selected.append(field)
+    return selected
+
+
+def export(dbf, out, fmt='csv', fields=None, start=0, stop=None, chunk_size=8192,
+           live_only=False, header=True, progress=None):
+    """
+    Writes the records of a database to a text stream, chunk_size records at a time,
+    so that memory use doesn't depend on the number of records.
+
+    :param dbf: DbaseFile to export.
+    :param out: Text stream to write to.
+    :param fmt: 'csv', 'jsonl' or 'tsv'.
+    :param fields: Names of the fields to export, or None for all of them.
+    :param start: Index of the first record.
+    :param stop: Index past the last record. Defaults to the number of records.
+    :param chunk_size: Number of records read and written at once.
+    :param live_only: If True, records marked as deleted are skipped.
+    :param header: If True, CSV and TSV exports start with a line with the field names.
+    :param progress: Function called after each chunk with the number of records written so far.
+    :return: Number of records written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt}")
+    if start is None or start < 0:
+        start = 0
+    if stop is None or stop > len(dbf):
+        stop = len(dbf)
+    selected = _select_fields(dbf, fields)
+    names = [field.name.strip() for field in selected]
+    if fmt == 'jsonl':
+        formatters = [_json_formatter(field) for field in selected]
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+    else:
+        formatters = [_text_formatter(field) for field in selected]
+        writer = csv.writer(out, dialect='excel-tab' if fmt == 'tsv' else 'excel')
+        if header:
+            writer.writerow(names)
+    written = 0
+    for chunk_start in range(start, stop, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, stop)
+        columns = dbf.to_columns(chunk_start, chunk_stop, chunk_size, names)
+        values = [column if format_value is None else list(map(format_value, column))
+                  for column, format_value in zip((columns[name] for name in names), formatters)]
+        rows = zip(*values)
+        if live_only:
+            rows = (row for row, deleted in zip(rows, columns['deleted']) if not deleted)
+        if fmt == 'jsonl':
+            lines = [encode(dict(zip(names, row))) for row in rows]
+            if lines:
+                out.write('\n'.join(lines))
+                out.write('\n')
+            written += len(lines)
+        else:
+            rows = list(rows)
+            writer.writerows(rows)
+            written += len(rows)
+        if progress is not None:
+            progress(written)
+    return written
+
+
+class Progress:
+    """
+    Reports the number of records written (out of 'total', if known) and the throughput 
+    on stderr, at most twice a second. Instances are meant to be passed as the 'progress'
+    argument of export() and dbfimport.import_rows().
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.started = self.reported = time.monotonic()
+
+    def __call__(self, written, final=False):
+        now = time.monotonic()
+        if not final and now - self.reported < 0.5:
+            return
+        self.reported = now
+        elapsed = max(now - self.started, 1e-9)
+        count = written if self.total is None else f"{written}/{self.total}"
+        sys.stderr.write(f"\r{count} records, {elapsed:.1f} s, {written / elapsed:,.0f} records/s")
+        if final:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='dbfexport', description="Exports the records of a DBF file as CSV, JSON Lines or TSV.")
+    parser.add_argument('filename', help="DBF file to export")
+    parser.add_argument('-f', '--format', choices=FORMATS, default='csv', help="output format (default: csv)")
+    parser.add_argument('-o', '--output', help="output file (default: standard output)")
+    parser.add_argument('--fields', help="comma separated list of the fields to export (default: all)")
+    parser.add_argument('--start', type=int, default=0, help="index of the first record to export")
+    parser.add_argument('--stop', type=int, default=None, help="index past the last record to export")
+    parser.add_argument('--live', action='store_true', help="skip records marked as deleted")
+    parser.add_argument('--no-header', action='store_true', help="don't write the field names line (CSV and TSV)")
+    parser.add_argument('--chunk-size', type=int, default=8192, help="records read at once (default: 8192)")
+    parser.add_argument('--encoding', default='utf-8', help="output encoding (default: utf-8)")
+    parser.add_argument('--progress', action='store_true', help="report progress and throughput on stderr")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.filename):
+        print(f"File {args.filename} not found.", file=sys.stderr)
+        sys.exit(1)
+    dbf = DbaseFile(args.filename, use_mmap=True)
+    fields = [name.strip() for name in args.fields.split(',')] if args.fields else None
+    try:
+        _select_fields(dbf, fields)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    stop = len(dbf) if args.stop is None else min(args.stop, len(dbf))
+    progress = Progress(max(stop - args.start, 0)) if args.progress else None
+    if args.output:
+        out = open(args.output, 'w', encoding=args.encoding, newline='', buffering=1 << 20)
+    else:
+        out = open(sys.stdout.fileno(), 'w', encoding=args.encoding, newline='', buffering=1 << 20, closefd=False)
+    try:
+        written = export(dbf, out, args.format, fields, args.start, stop, max(args.chunk_size, 1),
+                         args.live, not args.no_header, progress)
+    except BrokenPipeError:
+        # The reader went away (i.e. piped into head)
+        sys.stderr.close()
+        sys.exit(0)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        try:
+            out.close()
+        except BrokenPipeError:
+            pass
+    if progress is not None:
+        progress(written, final=True)
+
+if __name__ == "__main__":
+    main()  # Run the main function if the script is executed directly
@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+#-*- coding: utf_8 -*-
+# dbfimport.py - Loads CSV, JSON Lines or TSV data into a new DBF file, inferring its fields
+
+import os, re, sys, csv, json, math, argparse
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal
+from functools import partial
+from itertools import chain, islice
+
+try:
+    from dbase3_py.dbase3 import DbaseFile, DbaseField, FieldType, RecordEncoder
+    from dbase3_py.dbfexport import FORMATS, Progress
+except ImportError:
+    from dbase3 import DbaseFile, DbaseField, FieldType, RecordEncoder
+    from dbfexport import FORMATS, Progress
+
+_TRUE = frozenset(('t', 'y', 'true', 'yes', '.t.'))
+_FALSE = frozenset(('f', 'n', 'false', 'no', '.f.'))
+_LOGICAL = _TRUE | _FALSE
+_INTEGER = re.compile(r'[+-]?\d+$')
+_NUMBER = re.compile(r'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$')
+_DATE = re.compile(r'\d{4}-\d{2}-\d{2}$')
+
+MAX_CHARACTER = 254
+MAX_NUMERIC = 19
+MAX_FLOAT = 20
+MAX_DECIMALS = 15
+DEFAULT_SAMPLE = 10000
+
+
+def _text(value):
+    """
+    Returns the text of a value as read from CSV (a string) or JSON (any JSON value).
+    Meant for internal use only.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'T' if value else 'F'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+def _is_date(text):
+    if not _DATE.match(text):
+        return False
+    try:
+        date.fromisoformat(text)
+    except ValueError:
+        return False
+    return True
+
+def field_name(name, taken=()):
+    """
+    Turns a column name into a valid DBF field name: at most 10 letters, digits or underscores,
+    starting with a letter, and not in 'taken' (compared case insensitively).
+    """
+    name = re.sub(r'\W', '_', str(name).strip(), flags=re.ASCII) or 'FIELD'
+    if not name[0].isalpha():
+        name = 'F' + name
+    name = name[:10]
+    taken = {other.upper() for other in taken}
+    candidate, suffix = name, 1
+    while candidate.upper() in taken:
+        suffix += 1
+        candidate = name[:10 - len(str(suffix))] + str(suffix)
+    return candidate
+
+
+class _FieldStats:
+    """
+    What has been seen so far of the values of a column, in constant memory, to infer its field.
+    Stats of different chunks of rows are merged, so that chunks can be scanned in parallel.
+    Meant for internal use only.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.length = 0
+        self.logical = True
+        self.date = True
+        self.integer = True
+        self.leading_zeros = False
+        self.number = True
+        self.scientific = False
+        self.decimals = 0
+        self.width = 0
+
+    def update(self, texts):
+        """
+        Takes a collection of values, as text. Checks stop at the first value failing them.
+        """
+        texts = [text.rstrip() for text in texts]
+        stripped = [text.lstrip() for text in texts if text]
+        if not stripped:
+            return
+        self.count += len(stripped)
+        self.length = max(self.length, max(map(len, texts)))
+        if self.logical:
+            self.logical = all(text.lower() in _LOGICAL for text in stripped)
+        if self.date:
+            self.date = all(map(_is_date, stripped))
+        if self.integer:
+            self.integer = all(map(_INTEGER.match, stripped))
+        if not self.number:
+            return
+        if self.integer:
+            self.leading_zeros = self.leading_zeros or any(len(text.lstrip('+-')) > 1 and text.lstrip('+-')[0] == '0' 
+                                                           for text in stripped)
+            self.width = max(self.width, max(len(str(int(text))) for text in stripped))
+            return
+        for text in stripped:
+            match = _NUMBER.match(text)
+            number = float(text) if match else math.nan
+            if not math.isfinite(number):
+                self.number = False
+                return
+            if match.group(2):
+                self.scientific = True
+                decimals = max(-Decimal(text).as_tuple().exponent, 0)
+            else:
+                decimals = len(match.group(1).partition('.')[2])
+            self.decimals = max(self.decimals, decimals)
+            self.width = max(self.width, len(str(int(abs(number)))) + (text[0] == '-'))
+
+    def merge(self, other):
+        self.count += other.count
+        self.length = max(self.length, other.length)
+        self.logical = self.logical and other.logical
+        self.date = self.date and other.date
+        self.integer = self.integer and other.integer
+        self.leading_zeros = self.leading_zeros or other.leading_zeros
+        self.number = self.number and other.number
+        self.scientific = self.scientific or other.scientific
+        self.decimals = max(self.decimals, other.decimals)
+        self.width = max(self.width, other.width)
+
+    def field(self, name):
+        """
+        Returns the field tuple (name, type, length, decimals) for the values seen.
+        """
+        if not self.count:
+            return (name, FieldType.CHARACTER.value, 1, 0)
+        if self.logical:
+            return (name, FieldType.LOGICAL.value, 1, 0)
+        if self.date:
+            return (name, FieldType.DATE.value, 8, 0)
+        if self.integer:
+            if not self.leading_zeros and self.width <= MAX_NUMERIC:
+                return (name, FieldType.NUMERIC.value, self.width, 0)
+        elif self.number:
+            decimals = min(self.decimals, MAX_DECIMALS)
+            # Rounding to fewer decimals than the values have may carry to one more digit
+            length = self.width + (decimals + 1 if decimals else 0) + (self.decimals > decimals)
+            if not self.scientific and length <= MAX_NUMERIC:
+                return (name, FieldType.NUMERIC.value, length, decimals)
+            if length <= MAX_FLOAT:
+                return (name, FieldType.FLOAT.value, length, decimals)
+        return (name, FieldType.CHARACTER.value, min(self.length, MAX_CHARACTER), 0)
+
+
+def _distinct(values):
+    """
+    Returns the distinct values of a column, as text.
+    Meant for internal use only.
+    """
+    try:
+        distinct = set(values)
+    except TypeError:
+        distinct = None
+    # Values from CSV are all strings; others (i.e. 1 and True, equal as set members) are told apart as text
+    if distinct is None or not all(isinstance(value, str) for value in distinct):
+        distinct = set(map(_text, values))
+    return distinct
+
+def _scan_chunk(names, rows):
+    """
+    Returns the stats of the columns of a chunk of rows: a list in column order,
+    or a dictionary by key if names is None (rows being dictionaries).
+    Each distinct value of a column is looked at once, as values tend to repeat.
+    Meant for internal use only.
+    """
+    if names is None:
+        columns = {}
+        for row in rows:
+            for key, value in row.items():
+                columns.setdefault(key, set()).add(_text(value))
+    else:
+        columns = dict(enumerate(map(_distinct, zip(*(_row_values(row, names) for row in rows)))))
+    stats = {}
+    for key, texts in columns.items():
+        stats[key] = _FieldStats()
+        stats[key].update(texts)
+    if names is None:
+        return stats
+    return [stats.get(i) or _FieldStats() for i in range(len(names))]
+
+def _infer(rows, names=None, chunk_size=8192, executor=None, workers=0):
+    """
+    Scans the rows and returns the column names and the inferred fields.
+    Meant for internal use only.
+    """
+    total = {} if names is None else [_FieldStats() for _ in names]
+    for stats in _run_chunks(partial(_scan_chunk, names), _chunks(iter(rows), chunk_size), executor, workers):
+        if names is None:
+            for key, column in stats.items():
+                if key in total:
+                    total[key].merge(column)
+                else:
+                    total[key] = column
+        else:
+            for column, other in zip(total, stats):
+                column.merge(other)
+    if names is None:
+        names = list(total)
+        total = list(total.values())
+    fields = []
+    for name, column in zip(names, total):
+        fields.append(column.field(field_name(name, [field[0] for field in fields])))
+    return names, fields
+
+def infer_schema(rows, names=None):
+    """
+    Infers the fields of a database out of rows. Blank values are ignored; a field is, in order:
+        L if all values are logicals (T, F, Y, N, true, false, yes, no);
+        D if all values are dates (YYYY-MM-DD);
+        N with no decimals if all values are integers (without leading zeros, which are kept as text);
+        N with decimals if all values are numbers, some with a decimal point;
+        F if all values are numbers, some in scientific notation;
+        C otherwise, or if the numbers don't fit (up to 254 characters).
+
+    :param rows: Rows, each one a sequence of values (strings or JSON values) in column order
+                 or a dictionary with column names and values.
+    :param names: Column names. Defaults to the keys found in the rows, for dictionaries.
+                  Field names are derived from them (see field_name).
+    :return: List of tuples (name, type, length, decimals), as taken by DbaseFile.create.
+    """
+    return _infer(rows, names)[1]
+
+
+def _row_values(row, names):
+    """
+    Returns the values of a row in column order, padding or cutting sequences to the number of columns.
+    Meant for internal use only.
+    """
+    if isinstance(row, Mapping):
+        return [row.get(name) for name in names]
+    row = list(row)
+    if len(row) != len(names):
+        row = (row + [None] * len(names))[:len(names)]
+    return row
+
+def _converter(field):
+    """
+    Returns a function turning a value as read from CSV or JSON into a value for the field encoder.
+    Values which can't be converted are left as they are.
+    Meant for internal use only.
+    """
+    _, ftype, _, decimal = field
+    if ftype == FieldType.LOGICAL.value:
+        def convert(value):
+            if isinstance(value, bool):
+                return value
+            text = _text(value).strip().lower()
+            return text in _TRUE if text in _TRUE or text in _FALSE else None
+    elif ftype == FieldType.DATE.value:
+        def convert(value):
+            text = _text(value).strip()
+            try:
+                return date.fromisoformat(text) if text else None
+            except ValueError:
+                return text
+    elif ftype in (FieldType.NUMERIC.value, FieldType.FLOAT.value):
+        def convert(value):
+            if isinstance(value, int) and not isinstance(value, bool):
+                return value
+            text = _text(value).strip()
+            if not text:
+                return None
+            try:
+                number = float(text) if decimal or not _INTEGER.match(text) else int(text)
+            except ValueError:
+                return text
+            # Integral numbers go to fields without decimals as integers, so that they fit
+            if not decimal and isinstance(number, float) and number.is_integer():
+                return int(number)
+            return number
+    else:
+        convert = _text
+    return convert
+
+
+class _RowEncoder:
+    """
+    Converts and encodes rows into a block of records, ready for BulkAppender.add_encoded.
+    Meant for internal use only.
+    """
+
+    def __init__(self, names, fields):
+        self.names = names
+        self.fields = fields
+        self.converters = [_converter(field) for field in fields]
+        dbf_fields = [DbaseField(name, ftype, 0, length, decimal) for name, ftype, length, decimal in fields]
+        self.encoder = RecordEncoder(dbf_fields, sum(field[2] for field in fields) + 1)
+
+    def __call__(self, rows):
+        encode, converters, names = self.encoder.encode, self.converters, self.names
+        return b''.join(encode([convert(value) for convert, value in zip(converters, _row_values(row, names))])
+                        for row in rows)
+
+_row_encoder = None
+
+def _encode_chunk(names, fields, rows):
+    """
+    Encodes a chunk of rows. The encoder is kept between calls, i.e. in worker processes.
+    Meant for internal use only.
+    """
+    global _row_encoder
+    if _row_encoder is None or _row_encoder.names != names or _row_encoder.fields != fields:
+        _row_encoder = _RowEncoder(names, fields)
+    return _row_encoder(rows)
+
+def _chunks(rows, size):
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _run_chunks(func, chunks, executor=None, workers=0):
+    """
+    Yields func(chunk) for each chunk, in order. With an executor, a few chunks per worker
+    are in flight at once, so that memory use stays bounded.
+    Meant for internal use only.
+    """
+    if executor is None:
+        yield from map(func, chunks)
+        return
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(func, chunk))
+        if len(pending) > workers * 2:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _discard(dbf):
+    """
+    Closes and removes a database whose import failed, along with its memo file, if any,
+    so that the import can be run again.
+    Meant for internal use only.
+    """
+    dbf.file.close()
+    if dbf.memo is not None:
+        dbf.memo.close()
+    for name in (dbf.filename, dbf._memo_filename()):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def import_rows(filename, rows, names=None, fields=None, sample_size=None, chunk_size=8192,
+                workers=0, progress=None):
+    """
+    Creates a database and loads rows into it. Rows are converted and encoded chunk_size
+    at a time, and each chunk is written at once; the header is written only at the end.
+
+    Unless 'fields' is given, fields are inferred (see infer_schema). If sample_size is None,
+    out of all the rows, which are then read twice: 'rows' must be a list or another iterable
+    starting over on each iteration. Otherwise, out of the first sample_size rows, and rows
+    are read once; values of later rows may not fit, texts are then cut and numbers raise ValueError.
+
+    :param filename: Name of the database to create.
+    :param rows: Iterable of rows, each one a sequence of values in column order or a dictionary.
+    :param names: Column names. Defaults to the keys of the rows, for dictionaries.
+    :param fields: List of tuples (name, type, length, decimals) in column order, to skip inference.
+    :param sample_size: Number of rows to infer the fields from, None for all of them.
+    :param chunk_size: Number of records encoded and written at once.
+    :param workers: Number of processes scanning, converting and encoding chunks, 0 for none.
+    :param progress: Function called after each chunk with the number of records written so far.
+    :return: The new DbaseFile.
+    :raises FileExistsError: If the file already exists.
+    :raises ValueError: If there are no columns, or a number doesn't fit in its field.
+                        The database is removed if loading the rows fails.
+    """
+    chunk_size = max(chunk_size, 1)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers else None
+    try:
+        if fields is None:
+            if sample_size is None:
+                names, fields = _infer(rows, names, chunk_size, executor, workers)
+            else:
+                rows = iter(rows)
+                sample = list(islice(rows, max(sample_size, 1)))
+                names, fields = _infer(sample, names, chunk_size, executor, workers)
+                rows = chain(sample, rows)
+        if not fields:
+            raise ValueError("No fields to import")
+        if names is None:
+            names = [field[0] for field in fields]
+        dbf = DbaseFile.create(filename, fields)
+        try:
+            with dbf.bulk_append(1) as appender:
+                encode = partial(_encode_chunk, names, fields)
+                for block in _run_chunks(encode, _chunks(iter(rows), chunk_size), executor, workers):
+                    appender.add_encoded(block)
+                    if progress is not None:
+                        progress(appender.added)
+        except BaseException:
+            _discard(dbf)
+            raise
+        return dbf
+    finally:
+        if executor is not None:
+            if sys.version_info >= (3, 9):
+                executor.shutdown(cancel_futures=True)
+            else:
+                executor.shutdown()
+
+
+def read_csv(source, delimiter=',', header=True):
+    """
+    Returns the column names and an iterator over the rows of a CSV stream.
+    Without header, columns are named F1, F2...
+
+    :param source: Text stream, opened with newline=''.
+    :param delimiter: Character separating values.
+    :param header: If True, the first row holds the column names.
+    """
+    reader = csv.reader(source, delimiter=delimiter)
+    first = next(reader, None)
+    if first is None:
+        return [], iter(())
+    if header:
+        return first, reader
+    return [f"F{i}" for i in range(1, len(first) + 1)], chain([first], reader)
+
+def read_jsonl(source):
+    """
+    Returns an iterator over the objects of a JSON Lines stream, one per non blank line.
+    """
+    return (json.loads(line) for line in source if line.strip())
+
+
+class _Rows:
+    """
+    Rows of a seekable CSV, TSV or JSON Lines stream, read again from the start on each iteration.
+    Meant for internal use only.
+    """
+
+    def __init__(self, source, fmt, header):
+        self.source = source
+        self.fmt = fmt
+        self.header = header
+        self.start = source.tell()
+        self.names = None
+        if fmt != 'jsonl':
+            self.names = read_csv(source, '\t' if fmt == 'tsv' else ',', header)[0]
+
+    def __iter__(self):
+        self.source.seek(self.start)
+        if self.fmt == 'jsonl':
+            return read_jsonl(self.source)
+        return read_csv(self.source, '\t' if self.fmt == 'tsv' else ',', self.header)[1]
+
+def _open_rows(source, fmt, header, sample_size):
+    """
+    Returns the column names (None for JSON Lines), the rows of a stream and the sample size to use:
+    seekable streams are read twice when sample_size is None, others are sampled.
+    Meant for internal use only.
+    """
+    if sample_size is None and source.seekable():
+        rows = _Rows(source, fmt, header)
+        return rows.names, rows, None
+    sample_size = DEFAULT_SAMPLE if sample_size is None else sample_size
+    if fmt == 'jsonl':
+        return None, read_jsonl(source), sample_size
+    names, rows = read_csv(source, '\t' if fmt == 'tsv' else ',', header)
+    return names, rows, sample_size
+
+def import_file(filename, source, fmt='csv', header=True, sample_size=None, **kwargs):
+    """
+    Creates a database out of a CSV, JSON Lines or TSV stream (see import_rows, which takes
+    the remaining keyword arguments). For JSON Lines, columns are the keys of the objects.
+    Seekable streams (i.e. files) are read twice, once to infer the fields and then to load
+    the records, unless sample_size is given; other streams are sampled (10000 rows by default).
+
+    :param filename: Name of the database to create.
+    :param source: Text stream to read (opened with newline='' for CSV and TSV).
+    :param fmt: 'csv', 'jsonl' or 'tsv'.
+    :param header: If True, the first CSV or TSV row holds the column names.
+    :param sample_size: Number of rows to infer the fields from, None for all of them if possible.
+    :return: The new DbaseFile.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt}")
+    names, rows, sample_size = _open_rows(source, fmt, header, sample_size)
+    return import_rows(filename, rows, names, sample_size=sample_size, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='dbfimport', description="Loads CSV, JSON Lines or TSV data into a new DBF file, inferring its fields.")
+    parser.add_argument('source', help="file to import, - for standard input")
+    parser.add_argument('filename', nargs='?', help="DBF file to create")
+    parser.add_argument('-f', '--format', choices=FORMATS, help="input format (default: from the source extension, else csv)")
+    parser.add_argument('--no-header', action='store_true', help="the first row holds data, not column names (CSV and TSV)")
+    parser.add_argument('--sample', type=int, default=None, help="rows to infer the fields from (default: all, or 10000 from standard input)")
+    parser.add_argument('--schema', action='store_true', help="show the inferred fields and exit")
+    parser.add_argument('--chunk-size', type=int, default=8192, help="records encoded and written at once (default: 8192)")
+    parser.add_argument('-j', '--workers', type=int, default=0, help="processes scanning and encoding records (default: 0, none)")
+    parser.add_argument('--encoding', default='utf-8-sig', help="input encoding (default: utf-8-sig, i.e. UTF-8 with or without a byte order mark)")
+    parser.add_argument('--progress', action='store_true', help="report progress and throughput on stderr")
+    args = parser.parse_intermixed_args()
+
+    fmt = args.format
+    if fmt is None:
+        ext = os.path.splitext(args.source)[1].lower()
+        fmt = 'jsonl' if ext in ('.jsonl', '.ndjson') else 'tsv' if ext in ('.tsv', '.tab') else 'csv'
+    if args.filename is None and not args.schema:
+        parser.error("the filename is required, unless --schema is given")
+    if args.source != '-' and not os.path.exists(args.source):
+        print(f"File {args.source} not found.", file=sys.stderr)
+        sys.exit(1)
+    if not args.schema and os.path.exists(args.filename):
+        print(f"File {args.filename} already exists.", file=sys.stderr)
+        sys.exit(1)
+    if args.source == '-':
+        source = open(sys.stdin.fileno(), encoding=args.encoding, newline='', closefd=False)
+    else:
+        source = open(args.source, encoding=args.encoding, newline='')
+    try:
+        if args.schema:
+            names, rows, sample_size = _open_rows(source, fmt, not args.no_header, args.sample)
+            if sample_size is not None:
+                rows = islice(rows, max(sample_size, 1))
+            for name, ftype, length, decimal in infer_schema(rows, names):
+                print(f"{name:<10} {ftype} {length:>3} {decimal:>2}")
+            return
+        progress = Progress(None) if args.progress else None
+        dbf = import_file(args.filename, source, fmt, not args.no_header, args.sample,
+                          chunk_size=args.chunk_size, workers=max(args.workers, 0), progress=progress)
+        if progress is not None:
+            progress(len(dbf), final=True)
+    except (ValueError, csv.Error) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        source.close()
+
+if __name__ == "__main__":
+    main()  # Run the main function if the script is executed directly
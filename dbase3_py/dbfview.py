@@ -12,20 +12,241 @@ else:
     print("Unsupported OS")
     sys.exit(1)
 
-from functools import reduce
-from itertools import islice
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Sequence
+from datetime import datetime
+from threading import Thread, Event
 
 try:
-    from dbase3_py.dbase3 import DbaseFile
+    from dbase3_py.dbase3 import DbaseFile, FieldType
 except ImportError:
-    from dbase3 import DbaseFile
+    from dbase3 import DbaseFile, FieldType
 
-def show(stdscr, title, subtitle, textlines, length):
+
+class RecordLines(Sequence):
+    """
+    Lazy sequence of the text lines of the records of a database, as given by DbaseFile.lines.
+    Lines are read and formatted a page at a time, only when asked for, and the most recently
+    used pages are kept; so the viewer reads the visible window (and a margin around it),
+    whatever the size of the file.
+    """
+
+    def __init__(self, dbf, page_size: int = 256, max_pages: int = 16, margin: int = 64, fieldsep: str = ""):
+        """
+        :param dbf: DbaseFile to show.
+        :param page_size: Number of lines read and formatted at once.
+        :param max_pages: Maximum number of pages kept.
+        :param margin: Number of lines around the requested ones which are read ahead.
+        :param fieldsep: Separator between fields.
+        """
+        self.dbf = dbf
+        self.page_size = max(page_size, 1)
+        self.max_pages = max(max_pages, 1)
+        self.margin = margin
+        self.fieldsep = fieldsep
+        self.length = len(dbf)
+        self.pages = OrderedDict()
+        self.names_lengths = list(zip(dbf.field_names, dbf.max_field_lengths))
+
+    def __len__(self):
+        return self.length
+
+    def _page(self, number):
+        """
+        Returns the lines of a page, reading and formatting them if the page isn't kept.
+        Meant for internal use only.
+        """
+        page = self.pages.get(number)
+        if page is not None:
+            self.pages.move_to_end(number)
+            return page
+        start = number * self.page_size
+        stop = min(start + self.page_size, self.length)
+        page = self.pages[number] = list(self.dbf.lines(start, stop, self.fieldsep, self.page_size))
+        if len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+        return page
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if start >= stop:
+                return []
+            # Pages of the margin are read now, so that scrolling on finds them
+            for number in (max(start - self.margin, 0) // self.page_size, 
+                           (min(stop + self.margin, self.length) - 1) // self.page_size):
+                self._page(number)
+            first, last = start // self.page_size, (stop - 1) // self.page_size
+            lines = [line for number in range(first, last + 1) for line in self._page(number)]
+            offset = first * self.page_size
+            return lines[start - offset:stop - offset]
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError("Line index out of range")
+        return self._page(key // self.page_size)[key % self.page_size]
+
+    def line(self, index):
+        """
+        Returns the line of a single record, out of its page if kept, or else formatting
+        only that record, so that scattered records (i.e. in filter mode) don't read whole pages.
+        """
+        page = self.pages.get(index // self.page_size)
+        if page is not None:
+            return page[index % self.page_size]
+        return self.dbf.line(index, self.fieldsep, self.names_lengths)
+
+
+class Search:
+    """
+    Search for the records whose value in a field matches a text, run in a background thread
+    so that the viewer never waits for it. Character fields match if they start with the text
+    (ignoring case); numeric, date (YYYY-MM-DD) and logical (T/F) fields if they are equal to it.
+    Only the records an open index on the field points to are read, if there is one; otherwise
+    the database is read in chunks (see DbaseFile.where). Indexes of the matching records are
+    appended to 'matches', in order, as they are found, so they can be used while the search goes on.
+
+    Methods:
+        __init__(self, dbf, fieldname, text, chunk_size=16384)
+        cancel(self)
+        next(self, index)
+        previous(self, index)
+    """
+
+    def __init__(self, dbf, fieldname: str, text: str, chunk_size: int = 16384):
+        """
+        :param dbf: DbaseFile to search.
+        :param fieldname: Name of the field to search in.
+        :param text: Text to search for.
+        :param chunk_size: Number of records read at once; the search can be cancelled between chunks.
+        :raises ValueError: If the field doesn't exist, or the text isn't valid for its type.
+        """
+        field = dbf.get_field(fieldname)
+        if not field:
+            raise ValueError(f"Field {fieldname} not found")
+        self.dbf = dbf
+        self.fieldname = field.name.strip()
+        self.text = text
+        self.chunk_size = max(chunk_size, 1)
+        self.matches = []
+        self.scanned = 0
+        self.done = False
+        self.error = None
+        self.op, self.value = self._query(field, text)
+        self.cancelled = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _query(field, text):
+        """
+        Returns the DbaseFile.where operator and value to search for 'text' in a field.
+        Meant for internal use only.
+        """
+        if field.type == FieldType.CHARACTER.value:
+            return 'istartswith', text
+        try:
+            if field.type in (FieldType.NUMERIC.value, FieldType.FLOAT.value):
+                return '==', float(text) if any(c in text for c in '.eE') else int(text)
+            if field.type == FieldType.DATE.value:
+                return '==', datetime.strptime(text.replace('-', ''), '%Y%m%d')
+        except ValueError:
+            raise ValueError(f"Invalid value {text} for field {field.name.strip()}")
+        if field.type == FieldType.LOGICAL.value and text[:1] in ('T', 't', 'Y', 'y', 'F', 'f', 'N', 'n'):
+            return '==', text[:1] in ('T', 't', 'Y', 'y')
+        raise ValueError(f"Can't search field {field.name.strip()} for {text}")
+
+    def _test(self, value):
+        if self.op == 'istartswith':
+            return isinstance(value, str) and value.lower().startswith(self.value.lower())
+        return value == self.value
+
+    def _run(self):
+        dbf, total = self.dbf, len(self.dbf)
+        try:
+            candidates = dbf._index_candidates(self.fieldname, self.value, None)
+            if candidates is not None:
+                # Index keys may be cut, so candidates are checked against the records
+                for start in range(0, len(candidates), 1024):
+                    if self.cancelled.is_set():
+                        return
+                    for i in candidates[start:start + 1024]:
+                        if self._test(dbf.get_record(i, [self.fieldname])[self.fieldname]):
+                            self.matches.append(i)
+                    self.scanned = total * min(start + 1024, len(candidates)) // len(candidates)
+                return
+            for start in range(0, total, self.chunk_size):
+                if self.cancelled.is_set():
+                    return
+                stop = min(start + self.chunk_size, total)
+                self.matches.extend(i for i, _ in dbf.where(self.fieldname, self.op, self.value, start, stop, self.chunk_size))
+                self.scanned = stop
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.done = True
+
+    def cancel(self):
+        """
+        Stops the search, after the chunk being read.
+        """
+        self.cancelled.set()
+
+    def next(self, index):
+        """
+        Returns the index of the first match after record 'index' found so far, or None.
+        """
+        i = bisect_right(self.matches, index)
+        return self.matches[i] if i < len(self.matches) else None
+
+    def previous(self, index):
+        """
+        Returns the index of the last match before record 'index', or None.
+        """
+        i = bisect_left(self.matches, index)
+        return self.matches[i - 1] if i else None
+
+
+class FilteredLines(Sequence):
+    """
+    Sequence of the lines of the records matched by a search, growing as the search goes on.
+    """
+
+    def __init__(self, lines, search):
+        """
+        :param lines: RecordLines of the database.
+        :param search: Search whose matches are shown.
+        """
+        self.lines = lines
+        self.search = search
+
+    def __len__(self):
+        return len(self.search.matches)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.lines.line(i) for i in self.search.matches[key]]
+        return self.lines.line(self.search.matches[key])
+
+
+
+def show(stdscr, title, subtitle, textlines, length, dbf=None):
     """
     Shows a list of scrolling text lines under a title and subtitle in a curses window.
+    'textlines' is a sequence (i.e. a RecordLines, or a list) of which only the visible lines 
+    are taken; other iterables are turned into a list first.
+    Given the database the lines come from (and a RecordLines), a status line is shown
+    at the bottom and these keys are available too:
+        /       incremental search: Tab changes the field, Enter keeps the position, Esc goes back
+        n, N    next and previous match
+        f       filter mode: shows only the matching records (press again to show all of them)
+        g       go to a record number
     """
-    textlines = list(textlines)
-    max_line_length = reduce(lambda x, y: max(x, len(y)), textlines, 0)
+    if not isinstance(textlines, Sequence):
+        textlines = list(textlines)
     curses.cbreak()
     stdscr.keypad(True)
 
@@ -52,9 +273,57 @@ def show(stdscr, title, subtitle, textlines, length):
     prev_index = -1
     prev_start_line = -1
 
+    status = dbf is not None
+    fieldnames = dbf.field_names if status else []
+    field_number = 0
+    search = None      # Current search
+    filtered = False   # If True, only the records matched by the search are shown
+    mode = None        # 'search' or 'goto' while the user types
+    entry = ''         # Text typed so far
+    message = ''       # Shown on the status line until the next key
+    saved = None       # Search and record to go back to when a search is cancelled
+    landed = True      # False until the cursor moves to the first match of a new search
+    progress = None    # Filtered lines last shown
+
+    def record_at(i):
+        # Record shown at line i
+        if not filtered or search is None:
+            return i
+        matches = search.matches
+        return matches[i] if i < len(matches) else None
+
+    def line_of(record):
+        # Line showing the record, or the first match after it in filter mode
+        if not filtered or search is None:
+            return record
+        return min(bisect_left(search.matches, record), max(len(search.matches) - 1, 0))
+
+    def start_search():
+        nonlocal search, message, landed
+        if search is not None and search is not saved[0]:
+            search.cancel()
+        search, landed = None, True
+        if entry:
+            try:
+                search, landed = Search(dbf, fieldnames[field_number], entry), False
+            except ValueError as e:
+                message = str(e)
+
     while True:
+        rows = FilteredLines(textlines, search) if filtered and search is not None else textlines
+        length = len(rows)
+
+        # The cursor goes to the first match from where the search started, as soon as there is one
+        if not landed and search.matches:
+            target = search.next(saved[1] - 1)
+            if target is None and search.done:
+                target = search.matches[0]
+            if target is not None:
+                index, landed = line_of(target), True
+
         # Calculate the number of visible lines for scrolling, starting from the third line
-        visible_lines = height - 2  # Leave the first 2 lines for the title and subtitle
+        visible_lines = height - 2 - status  # Leave the first 2 lines for the title and subtitle, and the last for the status
+        index = max(0, min(index, length - 1))
 
         # Adjust the start_line to ensure the cursor stays within the visible window
         if index < start_line:
@@ -62,31 +331,111 @@ def show(stdscr, title, subtitle, textlines, length):
         elif index >= start_line + visible_lines:
             start_line = index - visible_lines + 1
 
-        # Only redraw lines if scrolling or index changes
-        if start_line != prev_start_line or index != prev_index:
+        # Only redraw lines if scrolling or index changes, or the filtered lines change
+        state = (search, len(search.matches), search.done) if rows is not textlines else None
+        if start_line != prev_start_line or index != prev_index or state != progress:
             # Redraw visible lines
-            for i, line in enumerate(textlines[start_line:start_line + visible_lines]):
+            lines = rows[start_line:start_line + visible_lines]
+            for i in range(visible_lines):
+                line = lines[i] if i < len(lines) else ''
                 # Calculate the screen line to draw on (offset by 2 for title and subtitle)
                 screen_line = i + 2
                 try:
-                    if start_line + i == index:
+                    if start_line + i == index and i < len(lines):
                         attr = curses.color_pair(2)
                     else:
                         attr = curses.color_pair(1)
                     # stdscr.addstr(screen_line, 0, line.rjust(max_line_length)[:width-1], attr)
-                    stdscr.addstr(screen_line, 0, line[:width-1], attr)
+                    stdscr.addstr(screen_line, 0, line.ljust(width - 1)[:width-1], attr)
                 except curses.error as e:
                     sys.stderr.write(f"Error drawing line {start_line + i}: {e}\n")
                     sys.stderr.flush()
             # Update only changed parts of the screen
             curses.doupdate()
 
+        if status:
+            if mode == 'search':
+                text = f" Search {fieldnames[field_number]}: {entry}_"
+            elif mode == 'goto':
+                text = f" Go to record: {entry}_"
+            else:
+                record = record_at(index)
+                text = f" Record {'-' if record is None else record + 1}/{len(dbf)}"
+            if search is not None:
+                found = f"{len(search.matches)} matches"
+                if not search.done:
+                    found += f", searching {100 * search.scanned // max(len(dbf), 1)}%"
+                if mode is None:
+                    found = f"{search.fieldname} {search.text}: {found}"
+                text += f"  [{found}{', filter' if filtered else ''}]"
+            if message:
+                text += f"  {message}"
+            elif search is not None and search.error:
+                text += f"  {search.error}"
+            elif mode == 'search':
+                text += "  Tab: field  Enter: keep  Esc: cancel"
+            elif mode == 'goto':
+                text += "  Enter: go  Esc: cancel"
+            else:
+                text += "  /: search  n/N: next/prev  f: filter  g: go to  q: quit"
+            try:
+                stdscr.addstr(height - 1, 0, text.ljust(width - 1)[:width-1], curses.color_pair(3))
+            except curses.error:
+                pass
+
         # Update previous state
         prev_index = index
         prev_start_line = start_line
+        progress = state
 
-        # Wait for input
+        # Wait for input, or for a while if a search is going on, to show its progress
+        stdscr.timeout(100 if search is not None and not search.done else -1)
         key = stdscr.getch()
+        if key == -1:
+            continue
+        message = ''
+
+        if mode is not None:
+            # Typing a search text or a record number
+            if key in (curses.KEY_ENTER, 10, 13):
+                if mode == 'goto':
+                    if entry.isdigit():
+                        record = min(max(int(entry) - 1, 0), len(dbf) - 1)
+                        index = line_of(record)
+                        if filtered and record_at(index) != record:
+                            message = f"Record {record + 1} doesn't match, showing the next match"
+                else:
+                    if saved[0] is not None and saved[0] is not search:
+                        saved[0].cancel()
+                    saved = None
+                    landed = True
+                mode, entry = None, ''
+            elif key == 27:  # Esc
+                if mode == 'search':
+                    if search is not None and search is not saved[0]:
+                        search.cancel()
+                    search, record = saved
+                    saved, landed = None, True
+                    filtered = filtered and search is not None
+                    index = line_of(record)
+                mode, entry = None, ''
+            elif key in (curses.KEY_BACKSPACE, 127, 8):
+                entry = entry[:-1]
+                if mode == 'search':
+                    start_search()
+            elif key == 9 and mode == 'search':  # Tab
+                field_number = (field_number + 1) % len(fieldnames)
+                start_search()
+            elif key == curses.KEY_BTAB and mode == 'search':
+                field_number = (field_number - 1) % len(fieldnames)
+                start_search()
+            elif 32 <= key < 256:
+                if mode == 'search':
+                    entry += chr(key)
+                    start_search()
+                elif chr(key).isdigit():
+                    entry += chr(key)
+            continue
 
         # Handle key inputs
         if key == curses.KEY_UP and index > 0:
@@ -96,35 +445,75 @@ def show(stdscr, title, subtitle, textlines, length):
         elif key == curses.KEY_PPAGE:  # Page Up
             index = max(0, index - visible_lines)
         elif key == curses.KEY_NPAGE:  # Page Down
-            index = min(length - 1, index + visible_lines)
+            index = max(0, min(length - 1, index + visible_lines))
+        elif key == curses.KEY_HOME:
+            index = 0
+        elif key == curses.KEY_END:
+            index = max(0, length - 1)
         elif key == ord('q') or key == ord('Q') or key == 27:  # Quit on 'q'
             break
+        elif not status:
+            continue
+        elif key == ord('/'):
+            record = record_at(index)
+            saved = (search, 0 if record is None else record)
+            mode, entry = 'search', ''
+            if search is not None:
+                field_number = fieldnames.index(search.fieldname)
+        elif key == ord('g'):
+            mode, entry = 'goto', ''
+        elif key in (ord('n'), ord('N')):
+            record = record_at(index)
+            if search is None:
+                message = "No search, press / to search"
+            elif record is not None:
+                target = search.next(record) if key == ord('n') else search.previous(record)
+                if target is None and search.matches:
+                    # Wrap around
+                    target = search.matches[0] if key == ord('n') else search.matches[-1]
+                    message = "Search wrapped"
+                if target is not None:
+                    index = line_of(target)
+        elif key == ord('f'):
+            if search is None:
+                message = "No search, press / to search"
+            else:
+                record = record_at(index)
+                filtered = not filtered
+                index = line_of(0 if record is None else record)
+
+    if search is not None:
+        search.cancel()
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python dbfview.py <filename.dbf>")
+        print("Usage: python dbfview.py <filename.dbf> [index.ndx ...]")
         sys.exit(1)
     filename = sys.argv[1]
     if not os.path.exists(filename):
         print(f"File {filename} not found.")
         sys.exit(1)
-    dbf = DbaseFile(filename)
+    # Searches run in a background thread while the viewer reads, both out of the mapped file
+    dbf = DbaseFile(filename, use_mmap=True, indexes=sys.argv[2:])
     title, length = f"{filename} - {dbf.header.records} records", dbf.header.records
     # subtitle = "Use arrow keys to scroll, 'q' to quit"
+    subtitle = dbf.headers_line()
     if dbf.header.records == 0:
         textlines = ["No records found."]
+        browsed = None
     # elif dbf.header.records > 1000000:
     #     func = dbf.csv
     #     subtitle = dbf.csv_headers_line()
     else:
-        func, subtitle = dbf.lines, dbf.headers_line()   
-    textlines = func()
+        # Lines are read as they are shown, so that huge files open at once
+        textlines = RecordLines(dbf)
+        browsed = dbf
     try:
         curses.set_escdelay(25)  # Reduce delay for ESC key
     except:
         pass    
     try:
-        curses.wrapper(lambda stdscr: show(stdscr, title, subtitle, textlines, length))
+        curses.wrapper(lambda stdscr: show(stdscr, title, subtitle, textlines, length, browsed))
     except curses.error as e:
         subprocess.run(["clear"])
         sys.stderr.write(f"Error initializing curses: {e}\n")
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+#-*- coding: utf_8 -*-
+
+"""
+dbt.py
+
+This module provides classes to read and write DBase III memo files (.dbt).
+A memo file is made of 512 bytes blocks. The first block holds the number of the next
+free block; each memo takes one or more consecutive blocks, starting at the block number
+stored in the memo field of the record, and ends with two 0x1A bytes.
+
+Classes:
+    DbtFile (Main class)
+    Memo
+"""
+
+import struct, os
+from mmap import mmap as memmap, ACCESS_READ
+from threading import RLock
+
+BLOCK_SIZE = 512
+TERMINATOR = b'\x1a\x1a'
+
+
+class Memo:
+    """
+    Lazy handle to the contents of a memo field, as found in records of databases with memo fields.
+    The memo text is read from the memo file only when first accessed (str(memo), memo.text,
+    comparisons, len), and kept afterwards. A memo with block number 0 is empty.
+    """
+
+    __slots__ = ('dbt', 'block', '_text')
+
+    def __init__(self, dbt, block: int = 0, text: str = None):
+        """
+        :param dbt: DbtFile holding the memo, or None.
+        :param block: Number of the first block of the memo, 0 if there is no memo.
+        :param text: Contents of the memo, if already known.
+        """
+        self.dbt = dbt
+        self.block = block
+        self._text = text
+
+    @property
+    def text(self):
+        """
+        Contents of the memo, read from the memo file on first access.
+        """
+        if self._text is None:
+            if not self.block:
+                self._text = ''
+            elif self.dbt is None:
+                raise FileNotFoundError("Memo file not found")
+            else:
+                self._text = self.dbt.read(self.block)
+        return self._text
+
+    @property
+    def loaded(self):
+        """
+        True if the memo text has already been read.
+        """
+        return self._text is not None
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        if self._text is None:
+            return f"Memo(block={self.block})"
+        return repr(self._text)
+
+    def __format__(self, spec):
+        return format(self.text, spec)
+
+    def __len__(self):
+        return len(self.text)
+
+    def __bool__(self):
+        return bool(self.block) and bool(self.text)
+
+    def __eq__(self, other):
+        if isinstance(other, Memo):
+            if self.dbt is other.dbt and self.block == other.block:
+                return True
+            other = other.text
+        if isinstance(other, str):
+            return self.text == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __reduce__(self):
+        # Memo files don't travel between processes: pickled memos become plain text
+        return (str, (self.text,))
+
+
+class DbtFile:
+    """
+    Class to read and write DBase III memo files (.dbt).
+
+    Methods:
+        create(cls, filename)
+        __init__(self, filename, use_mmap=False)
+        close(self)
+        read(self, block)
+        blocks_of(self, block)
+        write(self, text, block=0)
+    """
+
+    @classmethod
+    def create(cls, filename: str, use_mmap: bool = False):
+        """
+        Creates a new, empty memo file, overwriting any existing one.
+
+        :param filename: Name of the memo file.
+        """
+        header = bytearray(BLOCK_SIZE)
+        struct.pack_into('<L', header, 0, 1)
+        header[16] = 3
+        with open(filename, 'wb') as file:
+            file.write(header)
+        return cls(filename, use_mmap)
+
+    def __init__(self, filename: str, use_mmap: bool = False):
+        """
+        Opens an existing memo file.
+
+        :param filename: Name of the memo file.
+        :param use_mmap: If True, memos are read from a memory mapped view of the file.
+        """
+        self.filename = filename
+        self.file = open(filename, 'r+b')
+        self.use_mmap = use_mmap
+        self.memfile = None
+        self.memview = None
+        self.lock = RLock()
+        self.next_block = struct.unpack('<L', self.file.read(4))[0] or 1
+        self._map()
+
+    def __del__(self):
+        """
+        Closes the memo file when the instance is destroyed.
+        """
+        self.close()
+
+    def __str__(self):
+        return f"{self.filename} ({self.next_block} blocks)"
+
+    def close(self):
+        """
+        Closes the memo file.
+        """
+        self._unmap()
+        if not self.file.closed:
+            self.file.close()
+
+    def _map(self):
+        """
+        (Re)maps the memo file in memory, if use_mmap is True.
+        Meant for internal use only.
+        """
+        self._unmap()
+        if not self.use_mmap:
+            return
+        self.file.flush()
+        self.memfile = memmap(self.file.fileno(), 0, access=ACCESS_READ)
+        self.memview = memoryview(self.memfile)
+
+    def _unmap(self):
+        """
+        Releases the memory mapped view of the memo file, if any.
+        Meant for internal use only.
+        """
+        if getattr(self, 'memview', None) is not None:
+            self.memview.release()
+            self.memview = None
+        if getattr(self, 'memfile', None) is not None:
+            self.memfile.close()
+            self.memfile = None
+
+    def _read_at(self, offset, length):
+        """
+        Reads up to 'length' bytes at 'offset', out of the mapped view or with a positional read.
+        Meant for internal use only.
+        """
+        if self.memview is not None:
+            with self.memview[offset:offset + length] as view:
+                return view.tobytes()
+        if hasattr(os, 'pread'):
+            return os.pread(self.file.fileno(), length, offset)
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(length)
+
+    def _raw(self, block):
+        """
+        Returns the bytes of the memo starting at 'block', without the terminator.
+        Blocks are read one at a time until the terminator (or the end of the file) is found.
+        Meant for internal use only.
+        """
+        parts = []
+        offset = block * BLOCK_SIZE
+        while True:
+            data = self._read_at(offset, BLOCK_SIZE)
+            end = data.find(b'\x1a')
+            if end >= 0:
+                parts.append(data[:end])
+                break
+            parts.append(data)
+            if len(data) < BLOCK_SIZE:
+                break
+            offset += BLOCK_SIZE
+        return b''.join(parts)
+
+    def read(self, block: int):
+        """
+        Returns the text of the memo starting at 'block' ('' for block 0).
+        """
+        if not block:
+            return ''
+        return self._raw(block).decode('latin1')
+
+    def blocks_of(self, block: int):
+        """
+        Returns the number of blocks taken by the memo starting at 'block'.
+        """
+        if not block:
+            return 0
+        return -(-(len(self._raw(block)) + len(TERMINATOR)) // BLOCK_SIZE)
+
+    def write(self, text: str, block: int = 0):
+        """
+        Writes a memo and returns the number of its first block (0 for an empty memo).
+        If 'block' is the memo being replaced, its blocks are reused when the new text fits
+        in them (or when it is the last memo in the file, which can grow in place);
+        otherwise the text goes to new blocks at the end of the file.
+
+        :param text: Text of the memo.
+        :param block: First block of the memo being replaced, 0 for a new memo.
+        :raises UnicodeEncodeError: If the text has characters latin1 can't represent.
+        """
+        if not text:
+            return 0
+        data = text.encode('latin1') + TERMINATOR
+        needed = -(-len(data) // BLOCK_SIZE)
+        with self.lock:
+            taken = self.blocks_of(block)
+            if block and (needed <= taken or block + taken >= self.next_block):
+                start = block
+            else:
+                start = self.next_block
+            self.file.seek(start * BLOCK_SIZE)
+            self.file.write(data.ljust(needed * BLOCK_SIZE, b'\x00'))
+            if start + needed > self.next_block:
+                self.next_block = start + needed
+                self.file.seek(0)
+                self.file.write(struct.pack('<L', self.next_block))
+            self.file.flush()
+            if self.use_mmap:
+                self._map()
+        return start
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+#-*- coding: utf_8 -*-
+
+"""
+ndx.py
+
+This module provides a class to read and write DBase III index files (.ndx).
+An index file is a B+ tree of 512 bytes blocks, holding sorted keys built out of
+one or more fields of a database, each key pointing to a record number.
+
+Classes:
+    NdxIndex (Main class)
+    NdxHeader
+"""
+
+import struct, os
+from dataclasses import dataclass
+from bisect import bisect_left, bisect_right
+from typing import Tuple, Iterable
+from threading import Lock
+
+BLOCK_SIZE = 512
+
+# Table folding latin1 characters to upper case, leaving alone those whose upper case
+# is not a single latin1 character (e.g. 'ß' or 'ÿ'), so that keys keep their length.
+_upper_table = bytes(ord(c.upper()) if len(c.upper()) == 1 and ord(c.upper()) < 256 else ord(c)
+                     for c in map(chr, range(256)))
+
+
+def fold_upper(value: bytes) -> bytes:
+    """
+    Returns the latin1 bytes in 'value' folded to upper case, as done by UPPER() in index expressions.
+    """
+    return value.translate(_upper_table)
+
+
+@dataclass
+class NdxHeader:
+    root: int = 1 # 4 bytes, block number of the root node
+    blocks: int = 2 # 4 bytes, number of blocks in the file (next free block)
+    reserved: int = 0 # 4 bytes
+    key_length: int = 0 # 2 bytes
+    max_keys: int = 0 # 2 bytes, maximum number of keys per node
+    key_type: int = 0 # 2 bytes, 0 = character, 1 = numeric/date
+    group_length: int = 0 # 2 bytes, size of each key entry in a node
+    unique: int = 0 # 1 byte (offset 21)
+    expression: str = '' # null terminated, from offset 24
+
+    def load_bytes(self, bytes):
+        (self.root, self.blocks, self.reserved, self.key_length, self.max_keys,
+         self.key_type, self.group_length, self.unique) = struct.unpack('<LLLHHHHxBxx', bytes[:24])
+        self.expression = bytes[24:].split(b'\x00', 1)[0].decode('latin1').strip()
+
+    def to_bytes(self):
+        return struct.pack('<LLLHHHHxBxx', self.root, self.blocks, self.reserved, self.key_length,
+                           self.max_keys, self.key_type, self.group_length,
+                           self.unique) + self.expression.encode('latin1').ljust(BLOCK_SIZE - 24, b'\x00')
+
+
+class NdxIndex:
+    """
+    Class to manipulate DBase III index files (.ndx).
+
+    Keys are bytes of key_length for character indexes and floats for numeric ones
+    (dates are stored as julian day numbers). Record numbers are 1 based, as in DBase.
+    Interior nodes hold, for each child but the last, the greatest key found under that child.
+
+    Methods:
+        create(cls, filename, expression, key_length, numeric, entries)
+        __init__(self, filename)
+        close(self)
+        iter_from(self, key)
+        find(self, key)
+        startswith(self, prefix)
+        insert(self, key, recno)
+        remove(self, key, recno)
+        rebuild(self, entries)
+    """
+
+    @classmethod
+    def create(cls, filename: str, expression: str, key_length: int, numeric: bool = False,
+               entries: Iterable[Tuple[object, int]] = ()):
+        """
+        Creates a new index file, overwriting any existing one, and loads it with the given entries.
+
+        :param filename: Name of the index file.
+        :param expression: Key expression, i.e. 'NAME', 'UPPER(NAME)' or 'LAST+FIRST'.
+        :param key_length: Length of the keys (8 for numeric indexes).
+        :param numeric: True for numeric or date keys, False for character keys.
+        :param entries: Iterable of (key, recno) tuples, in any order.
+        """
+        header = NdxHeader()
+        header.key_length = 8 if numeric else key_length
+        header.key_type = 1 if numeric else 0
+        header.group_length = (header.key_length + 8 + 3) // 4 * 4
+        # Room for max_keys entries plus the trailing child pointer of interior nodes
+        header.max_keys = (BLOCK_SIZE - 8) // header.group_length
+        header.expression = expression
+        with open(filename, 'wb') as file:
+            file.write(header.to_bytes())
+        index = cls(filename)
+        index.rebuild(entries)
+        return index
+
+    def __init__(self, filename: str):
+        """
+        Opens an existing index file.
+
+        :param filename: Name of the index file.
+        """
+        self.filename = filename
+        self.file = open(filename, 'r+b')
+        self.lock = Lock()
+        self.header = NdxHeader()
+        self.header.load_bytes(self.file.read(BLOCK_SIZE))
+        self.numeric = self.header.key_type == 1
+        self.key_struct = struct.Struct('<d' if self.numeric else f'{self.header.key_length}s')
+
+    def __del__(self):
+        """
+        Closes the index file when the instance is destroyed.
+        """
+        self.close()
+
+    def __str__(self):
+        return f"{self.filename} ({self.header.expression})"
+
+    def close(self):
+        """
+        Closes the index file.
+        """
+        if not self.file.closed:
+            self.file.close()
+
+    @property
+    def expression(self):
+        return self.header.expression
+
+    def _read_node(self, block):
+        """
+        Reads a node, returning a tuple of lists (keys, recnos, children).
+        Leaves have no children; interior nodes have one child more than keys.
+        Nodes are read with positional I/O where available, so that threads reading 
+        the index at once don't share a file position.
+        Meant for internal use only.
+        """
+        if hasattr(os, 'pread'):
+            data = os.pread(self.file.fileno(), BLOCK_SIZE, block * BLOCK_SIZE)
+        else:
+            with self.lock:
+                self.file.seek(block * BLOCK_SIZE)
+                data = self.file.read(BLOCK_SIZE)
+        count = struct.unpack_from('<L', data)[0]
+        group = self.header.group_length
+        keys, recnos, children = [], [], []
+        for i in range(count):
+            position = 4 + i * group
+            child, recno = struct.unpack_from('<LL', data, position)
+            keys.append(self.key_struct.unpack_from(data, position + 8)[0])
+            recnos.append(recno)
+            children.append(child)
+        last_child = struct.unpack_from('<L', data, 4 + count * group)[0]
+        if last_child or (count and children[0]):
+            children.append(last_child)
+        else:
+            children = []
+        return keys, recnos, children
+
+    def _write_node(self, block, keys, recnos, children):
+        """
+        Writes a node at the given block number.
+        Meant for internal use only.
+        """
+        group = self.header.group_length
+        data = bytearray(BLOCK_SIZE)
+        struct.pack_into('<L', data, 0, len(keys))
+        for i, key in enumerate(keys):
+            position = 4 + i * group
+            struct.pack_into('<LL', data, position, children[i] if children else 0, recnos[i])
+            self.key_struct.pack_into(data, position + 8, key)
+        if children:
+            struct.pack_into('<L', data, 4 + len(keys) * group, children[-1])
+        if hasattr(os, 'pwrite'):
+            os.pwrite(self.file.fileno(), data, block * BLOCK_SIZE)
+        else:
+            with self.lock:
+                self.file.seek(block * BLOCK_SIZE)
+                self.file.write(data)
+
+    def _new_block(self):
+        block = self.header.blocks
+        self.header.blocks += 1
+        return block
+
+    def _write_header(self):
+        with self.lock:
+            self.file.seek(0)
+            self.file.write(self.header.to_bytes())
+            self.file.flush()
+
+    def rebuild(self, entries: Iterable[Tuple[object, int]]):
+        """
+        Discards the contents of the index and bulk loads it, bottom up, with the given entries.
+
+        :param entries: Iterable of (key, recno) tuples, in any order.
+        """
+        entries = sorted(entries)
+        max_keys = self.header.max_keys
+        self.header.blocks = 1
+        self.file.truncate(BLOCK_SIZE)
+        # Leaves, as (block, greatest key) tuples
+        level = []
+        for i in range(0, len(entries), max_keys):
+            chunk = entries[i:i + max_keys]
+            block = self._new_block()
+            self._write_node(block, [key for key, _ in chunk], [recno for _, recno in chunk], [])
+            level.append((block, chunk[-1][0]))
+        if not level:
+            block = self._new_block()
+            self._write_node(block, [], [], [])
+            level.append((block, None))
+        while len(level) > 1:
+            upper_level = []
+            for i in range(0, len(level), max_keys + 1):
+                chunk = level[i:i + max_keys + 1]
+                block = self._new_block()
+                keys = [key for _, key in chunk[:-1]]
+                self._write_node(block, keys, [0] * len(keys), [child for child, _ in chunk])
+                upper_level.append((block, chunk[-1][1]))
+            level = upper_level
+        self.header.root = level[0][0]
+        self._write_header()
+
+    def _descend(self, key, path=None):
+        """
+        Walks down from the root to the leaf where 'key' belongs, returning the
+        block number and contents of that leaf. If a list is passed as 'path',
+        (block, keys, recnos, children, index) tuples for the interior nodes visited are appended to it.
+        Meant for internal use only.
+        """
+        block = self.header.root
+        keys, recnos, children = self._read_node(block)
+        while children:
+            i = bisect_left(keys, key)
+            if path is not None:
+                path.append((block, keys, recnos, children, i))
+            block = children[i]
+            keys, recnos, children = self._read_node(block)
+        return block, keys, recnos
+
+    def _walk(self, key):
+        """
+        Returns a generator of (block, position, key, recno) tuples for the leaf entries,
+        in key order, starting at the first key greater than or equal to 'key'.
+        Meant for internal use only.
+        """
+        path = []
+        block, keys, recnos = self._descend(key, path)
+        i = bisect_left(keys, key)
+        while True:
+            while i < len(keys):
+                yield block, i, keys[i], recnos[i]
+                i += 1
+            # Climb up to the first ancestor with a child to the right, then go down its leftmost branch
+            while path and path[-1][4] + 1 >= len(path[-1][3]):
+                path.pop()
+            if not path:
+                return
+            pblock, pkeys, precnos, pchildren, pi = path.pop()
+            path.append((pblock, pkeys, precnos, pchildren, pi + 1))
+            block = pchildren[pi + 1]
+            keys, recnos, children = self._read_node(block)
+            while children:
+                path.append((block, keys, recnos, children, 0))
+                block = children[0]
+                keys, recnos, children = self._read_node(block)
+            i = 0
+
+    def iter_from(self, key):
+        """
+        Returns a generator of (key, recno) tuples, in key order,
+        starting at the first key greater than or equal to 'key'.
+        """
+        return ((k, recno) for _, _, k, recno in self._walk(key))
+
+    def find(self, key):
+        """
+        Returns a list with the record numbers whose key equals 'key'.
+        """
+        ret = []
+        for k, recno in self.iter_from(key):
+            if k != key:
+                break
+            ret.append(recno)
+        return ret
+
+    def startswith(self, prefix: bytes):
+        """
+        Returns a list with the record numbers whose key starts with 'prefix' (character indexes only).
+        """
+        ret = []
+        for k, recno in self.iter_from(prefix):
+            if not k.startswith(prefix):
+                break
+            ret.append(recno)
+        return ret
+
+    def insert(self, key, recno: int):
+        """
+        Inserts a key pointing to the given record number, splitting nodes as needed.
+        """
+        path = []
+        block, keys, recnos = self._descend(key, path)
+        i = bisect_right(keys, key)
+        keys.insert(i, key)
+        recnos.insert(i, recno)
+        children = []
+        max_keys = self.header.max_keys
+        while True:
+            if len(keys) <= max_keys:
+                self._write_node(block, keys, recnos, children)
+                break
+            # Split: the lower half goes to a new block, the upper half stays in place,
+            # so the parent entry pointing to this block (an upper bound) remains valid.
+            half = len(keys) // 2
+            left = self._new_block()
+            if children:
+                left_key = keys[half]
+                self._write_node(left, keys[:half], recnos[:half], children[:half + 1])
+                keys, recnos, children = keys[half + 1:], recnos[half + 1:], children[half + 1:]
+            else:
+                left_key = keys[half - 1]
+                self._write_node(left, keys[:half], recnos[:half], [])
+                keys, recnos = keys[half:], recnos[half:]
+            self._write_node(block, keys, recnos, children)
+            if not path:
+                root = self._new_block()
+                self._write_node(root, [left_key], [0], [left, block])
+                self.header.root = root
+                break
+            block, keys, recnos, children, i = path.pop()
+            keys.insert(i, left_key)
+            recnos.insert(i, 0)
+            children.insert(i, left)
+        self._write_header()
+
+    def remove(self, key, recno: int):
+        """
+        Removes the key pointing to the given record number. Returns True if it was found.
+        Nodes are not merged; keys in interior nodes remain valid upper bounds.
+        """
+        for block, i, k, r in self._walk(key):
+            if k != key:
+                break
+            if r == recno:
+                keys, recnos, children = self._read_node(block)
+                del keys[i], recnos[i]
+                self._write_node(block, keys, recnos, children)
+                self.file.flush()
+                return True
+        return False
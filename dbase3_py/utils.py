@@ -5,6 +5,8 @@
 class Dict(dict):
      """Dict class with attributes equating dict keys"""
 
+     __slots__ = ()
+
      def __init__(self, d: dict = None, **kw):
          if d:
              super(Dict, self).__init__(d, **kw)
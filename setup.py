@@ -18,10 +18,15 @@ setup(
         'Operating System :: OS Independent',
     ],
     python_requires='>=3.6',
+    extras_require={
+        'numpy': ['numpy'],
+    },
     entry_points={
         'console_scripts': [
             'dbfview=dbase3_py.dbfview:main',
             'dbftest=dbase3_py.test:testdb',
+            'dbfexport=dbase3_py.dbfexport:main',
+            'dbfimport=dbase3_py.dbfimport:main',
         ],
     },    
 )
\ No newline at end of file